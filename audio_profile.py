@@ -0,0 +1,195 @@
+# audio_profile.py
+# Find the smallest stable FluidSynth audio buffer for this machine and save it as a profile.
+#
+#   python audio_profile.py --sf2 autobass.sf2 --driver alsa --device default
+#
+# Buffer configurations (audio.period-size x audio.periods) are tried from conservative to
+# aggressive while a stress pattern plays (dense chords on all bass channels) and a thread
+# redraws the dashboard off-screen, like the UI does during a knob sweep. A configuration
+# fails on any audio dropout (underrun) or when the synth's CPU load goes over --max-load.
+# FluidSynth's ALSA driver recovers from underruns without logging them, so dropouts are
+# detected from the audio clock instead: the frames rendered must keep up with wall time.
+# The last configuration that passed is written to audio_profile.json, which LiveFsPlayer
+# loads at startup.
+from __future__ import annotations
+
+import argparse
+import json
+import threading
+import time
+from ctypes import c_double, c_void_p
+from pathlib import Path
+
+import fluidsynth
+
+PROFILE_PATH = "audio_profile.json"
+
+# (audio.period-size, audio.periods), from safe to aggressive
+CANDIDATES = [(1024, 2), (512, 4), (512, 2), (256, 4), (256, 3), (256, 2), (128, 3), (128, 2), (64, 3), (64, 2)]
+
+# Not wrapped by pyfluidsynth (None if the library lacks it)
+fluid_synth_get_cpu_load = fluidsynth.cfunc('fluid_synth_get_cpu_load', c_double,
+							('synth', c_void_p, 1))
+
+
+def load_profile(profile_path: str | Path = PROFILE_PATH) -> dict:
+	"""FluidSynth settings of the saved profile, or {} if there is none."""
+	try:
+		profile = json.loads(Path(profile_path).read_text(encoding="utf-8"))
+	except (OSError, ValueError):
+		return {}
+	return dict(profile.get("settings", {}))
+
+
+def save_profile(settings: dict, results: list, profile_path: str | Path = PROFILE_PATH):
+	profile = {
+		"settings": settings,
+		"calibrated_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+		"results": results,
+	}
+	Path(profile_path).write_text(json.dumps(profile, indent=2), encoding="utf-8")
+
+
+class _DropoutDetector:
+	"""
+	Counts audio dropouts from the audio clock. A sequencer driven by the synth
+	(use_system_timer=False) advances with the frames the audio driver renders, and the
+	driver renders only as fast as the card plays, so wall time minus audio time (the lag)
+	stays within a period of its lowest value. After an underrun the frames the card
+	missed are never rendered, and the lag stays higher by the length of the dropout.
+	The lowest lag of each `window` seconds is compared, so a stall the buffer covers
+	(caught up right after) is not counted.
+	"""
+	TICKS = 10000		# sequencer ticks per second
+
+	def __init__(self, fs: fluidsynth.Synth, period_seconds: float, window: float = 0.25, margin: float = 0.002):
+		self.seq = fluidsynth.Sequencer(time_scale=self.TICKS, use_system_timer=False)
+		self.seq.register_fluidsynth(fs)
+		self.threshold = period_seconds + margin
+		self.window = window
+		self.count = 0
+		self._reference = None		# lowest lag so far (since the last dropout)
+		self._window_lag = None
+		self._window_end = time.monotonic() + window
+
+	def check(self):
+		now = time.monotonic()
+		lag = now - self.seq.get_tick() / self.TICKS
+		self._window_lag = lag if self._window_lag is None else min(self._window_lag, lag)
+		if now < self._window_end:
+			return
+		if self._reference is None or self._window_lag < self._reference:
+			self._reference = self._window_lag
+		elif self._window_lag - self._reference > self.threshold:
+			self.count += 1
+			self._reference = self._window_lag
+		self._window_lag = None
+		self._window_end = now + self.window
+
+	def close(self):
+		self.seq.delete()
+
+
+def _ui_load(stop: threading.Event, fps: float = 30.0):
+	"""Redraw the dashboard off-screen at `fps`, as during a knob sweep."""
+	import pygame
+	import draw
+	pygame.font.init()
+	surface = pygame.Surface((draw.SCREEN_W, draw.SCREEN_H))
+	squares = [{"text": f"pad {i}", "color": (40 * i, 120, 200)} for i in range(6)]
+	n = 0
+	while not stop.is_set():
+		draw.draw_dashboard(surface, squares, (n % 128) / 127.0, 100 + n % 40, "Fingered 1", "prev", f"song {n}", "next")
+		n += 1
+		stop.wait(1.0 / fps)
+
+
+def try_configuration(sf2_path, driver, device, period_size, periods, seconds, preset) -> dict:
+	"""Play the stress pattern with one buffer configuration, return its measurements."""
+	settings = {"audio.period-size": period_size, "audio.periods": periods}
+	fs = fluidsynth.Synth(**settings)
+	fs.start(driver=driver, device=device)
+	sfid = fs.sfload(sf2_path)
+	for ch in range(16):
+		if ch != 9:
+			fs.program_select(ch, sfid, 0, preset)
+
+	stop = threading.Event()
+	ui = threading.Thread(target=_ui_load, args=(stop,), daemon=True)
+	ui.start()
+
+	sample_rate = float(fs.get_setting("synth.sample-rate") or 44100.0)
+	dropouts = _DropoutDetector(fs, period_size / sample_rate)
+	max_load = 0.0
+	end = time.monotonic() + seconds
+	step = 0
+	held = []
+	while time.monotonic() < end:
+		# dense polyphony: an 8-note chord every 25 ms over 8 channels, released 4 steps later
+		chord = [(ch, 28 + (step * 5 + ch * 7) % 36) for ch in range(8)]
+		for ch, note in chord:
+			fs.noteon(ch, note, 110)
+		held.append(chord)
+		if len(held) > 4:
+			for ch, note in held.pop(0):
+				fs.noteoff(ch, note)
+		if fluid_synth_get_cpu_load is not None:
+			max_load = max(max_load, fluid_synth_get_cpu_load(fs.synth))
+		dropouts.check()
+		step += 1
+		time.sleep(0.025)
+
+	stop.set()
+	ui.join()
+	for ch in range(16):
+		fs.all_notes_off(ch)
+	time.sleep(0.1)
+	dropouts.close()
+	fs.delete()
+
+	return {
+		"settings": settings,
+		"latency_ms": round(period_size * periods / sample_rate * 1000.0, 1),
+		"xruns": dropouts.count,
+		"max_cpu_load": round(max_load, 1),
+	}
+
+
+def calibrate(sf2_path, driver="alsa", device="default", seconds=5.0, max_load=70.0, preset=0, candidates=CANDIDATES):
+	"""Return (settings of the lowest stable configuration or {}, list of results)."""
+	best, results = {}, []
+	for period_size, periods in candidates:
+		result = try_configuration(sf2_path, driver, device, period_size, periods, seconds, preset)
+		result["stable"] = result["xruns"] == 0 and result["max_cpu_load"] <= max_load
+		results.append(result)
+		print(
+			f"period-size {period_size:5d} x {periods}: {result['latency_ms']:6.1f} ms, "
+			f"{result['xruns']} xruns, cpu load {result['max_cpu_load']:.0f}% -> {'ok' if result['stable'] else 'FAIL'}"
+		)
+		if not result["stable"]:
+			break		# smaller buffers only get worse
+		best = result["settings"]
+	return best, results
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Calibrate the lowest stable FluidSynth audio buffer.")
+	parser.add_argument("--sf2", default="autobass.sf2")
+	parser.add_argument("--driver", default="alsa")
+	parser.add_argument("--device", default="default")
+	parser.add_argument("--seconds", type=float, default=5.0, help="stress time per configuration")
+	parser.add_argument("--max-load", type=float, default=70.0, help="max synth CPU load in percent")
+	parser.add_argument("--preset", type=int, default=0)
+	parser.add_argument("--out", default=PROFILE_PATH)
+	args = parser.parse_args()
+
+	best, results = calibrate(args.sf2, args.driver, args.device, args.seconds, args.max_load, args.preset)
+	if not best:
+		print("no stable configuration: keeping fluidsynth defaults")
+		return
+	save_profile(best, results, args.out)
+	print("saved", best, "to", args.out)
+
+
+if __name__ == "__main__":
+	main()
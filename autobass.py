@@ -1,6 +1,10 @@
 import sys
 import time
+startTime = time.monotonic()		# process start, for the time-to-first-note report
 import statistics
+import json
+import threading
+import queue
 
 sys.path.append('./')
 import pygame
@@ -9,10 +13,11 @@ import random
 import mido
 
 from collections import deque
-import update
 import song
 import draw
 import fluid_player
+import loop_cache
+import render_scheduler
 
 #TO DO
 #display pad that is playing (optional)
@@ -40,19 +45,26 @@ pip install google-api-python-client
 """
 
 
-# Main variables
-running = True
+# Main variables (initial values, the running state is kept by AutoBass)
 referenceTempo = 120	# initial tempo of midi file
-tempoRatio = 1.0		# to play slower or faster
-tapTempoRatio = None	# to play slower or faster
-knobTempoRatio = 1.0	# to play slower or faster
-playListIndex = 0
 audioVolume = 0.5
 noteOnMapping = {0:["tap tempo"], 1:["stop"], 2:["pad","0"], 3:["pad","1"], 4:["pad","2"], 5:["pad","3"], 6:["pad","4"], 7:["pad","5"], 8:["pad","6"]}
 ccMapping = {0:["volume"], 1:["tempo"], 2:["playlist"], 3:["sound"]}
 soundMapping = {"Acoustic 1":0, "Acoustic 2":1, "Fingered 1":2, "Fingered 2":3, "Fretless 1": 4, "Fretless 2": 5, "Picked 1": 6, "Picked 2": 7,  "Slap 1": 8,  "Slap 2": 9,  "Synth 1": 10,  "Synth 2": 11}
-soundName = "Acoustic 1";
+soundName = "Acoustic 1"
+launchQuantize = "bar"	# when a pad is hit while another one plays: "immediate", "beat" or "bar"
+playbackBackend = "sequencer"	# "sequencer": event timing by fluidsynth's own sequencer (audio clock), "direct": by the python thread
+showTimingOverlay = False	# show playback timing stats (lateness, or hand-over lead with the sequencer backend) on top of the dashboard, refreshed every second
+timingDumpPath = "./timing_dump.csv"	# playback timing stats written there on exit (None: no dump)
+tempoKnobRampBeats = 1	# tempo knob changes are ramped over that many beats to smooth knob jitter (0: immediate)
+soundfontPath = "autobass.sf2"	# only the presets of soundMapping are used: see sf2_trim.py to build a smaller soundfont
+lazySampleLoading = True	# load the samples of a bass sound when it is selected, not all of them at startup
+displayFps = 30		# max dashboard redraws per second; nothing is redrawn while nothing changes
+audioProfilePath = "./audio_profile.json"	# audio buffer sizes calibrated by audio_profile.py (missing file: fluidsynth defaults)
+playbackEngine = "live"		# "live": fluidsynth plays the midi files, "pcm": pads are pre-rendered to audio loops (low CPU)
+sessionRecordPath = None	# MIDI messages of the controller are recorded there, to be replayed by replay.py (None: no recording)
 assetPath = "./autobass_playlist"
+driveFolderUrl = "https://drive.google.com/drive/folders/1io1W0YnH7mI1X7S5Q3wC6OUZZVxWNRpT"	# playlist and midi files (public access)
 
 
 
@@ -63,290 +75,594 @@ class Event:
 			raise ValueError("Values must be a list or dictionary.")
 		self.label = label
 		self.values = values
+		self.time = time.monotonic()		# when recorded, to measure the handling latency
 
 class EventQueue:
+	"""
+	Events recorded by the MIDI input thread and by the main loop, read by the main loop.
+	"note on" events (pads, stop, tap) are kept in order and come out first. Other events
+	are coalesced by (label, first value), e.g. ("cc", "volume"): a knob sweep leaves only
+	its latest value.
+	"""
+	ORDERED_LABELS = ("note on",)
+
 	def __init__(self):
-		self.queue = deque()
+		self.queue = deque()		# ordered events
+		self.latest = {}			# coalesced events by (label, values[0]), in first-recorded order
+		self.lock = threading.Lock()
 
 	def record_event(self, label, values):
 		"""Create an Event and add it to the queue."""
 		event = Event(label, values)
-		self.queue.append(event)
+		with self.lock:
+			if label in self.ORDERED_LABELS:
+				self.queue.append(event)
+			else:
+				self.latest[(label, values[0] if values else None)] = event
 
 	def get_next_event(self):
 		"""Retrieve and remove the next Event from the queue."""
-		if self.queue:
-			return self.queue.popleft()
+		with self.lock:
+			if self.queue:
+				return self.queue.popleft()
+			if self.latest:
+				return self.latest.pop(next(iter(self.latest)))
 		return None
 
+	def drain(self):
+		"""Retrieve and remove all the Events: ordered events first, then the coalesced ones."""
+		with self.lock:
+			events = list(self.queue) + list(self.latest.values())
+			self.queue.clear()
+			self.latest.clear()
+		return events
+
 	def peek_next_event(self):
 		"""Retrieve the next Event without removing it."""
-		if self.queue:
-			return self.queue[0]
+		with self.lock:
+			if self.queue:
+				return self.queue[0]
+			if self.latest:
+				return next(iter(self.latest.values()))
 		return None
 
 	def is_empty(self):
 		"""Check if the queue is empty."""
-		return len(self.queue) == 0
+		return self.size() == 0
 
 	def size(self):
 		"""Return the number of events in the queue."""
-		return len(self.queue)
+		return len(self.queue) + len(self.latest)
 
 
 # class for handling tap tempo
 class TapTempo:
-	def __init__(self, reference_bpm, max_taps=6, timeout=2.0):
+	"""
+	Taps are fitted to a beat grid (tap time = t0 + beat * period) by a least-squares
+	regression where recent taps weigh more, so the tempo converges in a few taps.
+	A tap too close to the previous one is a double hit and is ignored; a missed tap, about
+	two periods after the previous one, counts as two beats. A single tap off the grid is
+	held back and dropped if the next tap is back on the grid; two off-grid taps in a row
+	that are about a beat apart start a new tap sequence (new tempo or new phase), which
+	gives a tempo only from its third tap.
+	tap() returns None, or (speed ratio, time of the last beat of the fitted grid): the
+	latter is the phase reference to align the loop on.
+	"""
+	def __init__(self, reference_bpm, max_taps=8, timeout=2.0, tolerance=0.25, decay=0.7):
 		self.reference_bpm = reference_bpm
+		# tap intervals of the tempo ratios the player can play
+		self.min_interval = 60.0 / (reference_bpm * fluid_player.MAX_SPEED)
+		self.max_interval = 60.0 / (reference_bpm * fluid_player.MIN_SPEED)
 		self.max_taps = max_taps
 		self.timeout = timeout
-		self.taps = []
+		self.tolerance = tolerance		# max distance of a tap to the grid, in beats
+		self.decay = decay				# weight of a tap relative to the next one
+		self.taps = []					# (time, beat number)
+		self.outlier = None				# time of the last off-grid tap, while not confirmed
+		self.min_taps = 2				# taps needed before a tempo is given (3 after a restart)
 
-	def tap(self):
-		now = time.monotonic()
+	def tap(self, now=None):
+		now = time.monotonic() if now is None else now
 
-		if self.taps and now - self.taps[-1] > self.timeout:
+		if self.taps and now - self.taps[-1][0] > self.timeout:
 			self.taps.clear()
+			self.outlier = None
+			self.min_taps = 2
 
-		self.taps.append(now)
+		if len(self.taps) < 2:
+			if self.taps and now - self.taps[-1][0] < self.min_interval:
+				return None									# double hit: ignored
+			if self.taps and now - self.taps[-1][0] > self.max_interval:
+				self.taps.clear()							# too slow to be a beat: start again
+			beat = self.taps[-1][1] + 1 if self.taps else 0
+		else:
+			intervals = [
+				(self.taps[i][0] - self.taps[i - 1][0]) / (self.taps[i][1] - self.taps[i - 1][1])
+				for i in range(1, len(self.taps))
+			]
+			period = statistics.median(intervals)
+			beats = (now - self.taps[-1][0]) / period
+			if beats < 1.0 - self.tolerance:
+				return None									# double hit: ignored
+			if abs(beats - round(beats)) > self.tolerance or round(beats) > 2:
+				# off the grid: a new tempo only if the previous tap was off the grid too, a beat before
+				if self.outlier is not None and 0.5 <= (now - self.outlier) / period <= 2.0:
+					self.taps = [(self.outlier, 0)]
+					self.outlier = None
+					self.min_taps = 3
+					beat = 1
+				else:
+					if self.outlier is None or now - self.outlier >= 0.5 * period:
+						self.outlier = now					# else a double hit of the off-grid tap
+					return None
+			else:
+				self.outlier = None							# a single off-grid tap: dropped
+				beat = self.taps[-1][1] + round(beats)
+
+		self.taps.append((now, beat))
 		self.taps = self.taps[-self.max_taps:]
 
-		if len(self.taps) < 2:
+		if len(self.taps) < self.min_taps:
 			return None
 
-		intervals = [
-			self.taps[i] - self.taps[i - 1]
-			for i in range(1, len(self.taps))
-		]
+		# weighted least squares of tap time against beat number
+		weights = [self.decay ** (len(self.taps) - 1 - i) for i in range(len(self.taps))]
+		total = sum(weights)
+		mean_b = sum(w * b for w, (t, b) in zip(weights, self.taps)) / total
+		mean_t = sum(w * t for w, (t, b) in zip(weights, self.taps)) / total
+		period = (
+			sum(w * (b - mean_b) * (t - mean_t) for w, (t, b) in zip(weights, self.taps))
+			/ sum(w * (b - mean_b) ** 2 for w, (t, b) in zip(weights, self.taps))
+		)
+		last_beat = mean_t + (self.taps[-1][1] - mean_b) * period
+
+		tapped_bpm = 60.0 / period
+		return tapped_bpm / self.reference_bpm, last_beat
+
+
+
+# tempo ratio in the range the player plays (as shown on the dashboard)
+def clamp_speed(ratio):
+	return max (fluid_player.MIN_SPEED, min (ratio, fluid_player.MAX_SPEED))
+
+
+# list of midi files of the selected song first, then of its neighbours (for preloading)
+def song_pad_paths(play_list, index, neighbours=1, asset_path=assetPath):
+	paths = []
+	order = [index]
+	for d in range (1, neighbours + 1):
+		order += [index - d, index + d]
+	for i in order:
+		if 0 <= i < len (play_list):
+			for pad in play_list [i].pads:
+				paths.append (asset_path + "/" + play_list [i].path + pad.file)
+	return paths
+
+
+# the 6 pads of a song as displayed: name and color (gray pads if not defined)
+def song_squares(song_config):
+	squares = []
+	square = {}
+	# define pads to be displayed
+	for i in range (0,6):
+		square = {}
+		try:
+			square ["text"] = song_config.pads [i].name
+			square ["color"] = song_config.pads [i].color_as_tuple()
+		except Exception as e:
+			square ["text"] = ""
+			square ["color"] = (128,128,128)		# gray pads if not defined
+		squares.append (square)
+	return squares
+
+
+# the application: controller events in, playback and dashboard out
+class AutoBass:
+	"""
+	Everything the application talks to is given to it, so that it also runs headless
+	(see replay.py: fake synth, SDL dummy video driver, MIDI messages fed by a thread):
+	  play_list   list of song.SongConfig
+	  player      fluid_player.LiveFsPlayer or loop_cache.PcmLoopEngine
+	  screen      pygame surface the dashboard is drawn on
+	MIDI messages are given to on_midi_message() from any thread. run() is the main loop;
+	it ends on pygame.QUIT, ESC or stop().
+	on_handled, when set, is called with (event, seconds from record to end of handling)
+	after each event.
+	"""
+	def __init__(self, play_list, player, screen, asset_path=assetPath, start_time=None):
+		self.playList = play_list
+		self.player = player
+		self.screen = screen
+		self.assetPath = asset_path
+		self.startTime = time.monotonic() if start_time is None else start_time
+		self.firstNoteTime = None		# seconds from startTime to the first pad played
+
+		self.running = True
+		self.referenceTempo = referenceTempo	# tempo of the midi file playing
+		self.tempoRatio = 1.0					# to play slower or faster
+		self.tapTempoRatio = None				# to play slower or faster
+		self.knobTempoRatio = 1.0				# to play slower or faster
+		self.playListIndex = 0
+		self.audioVolume = audioVolume
+		self.soundName = soundName
+
+		self.eq = EventQueue()		# event queue to manage the events happening in the main loop
+		# state changes mark the display dirty, it is redrawn at most displayFps times per second
+		self.renderer = render_scheduler.RenderScheduler(displayFps)
+		self.dashboard = draw.Dashboard()		# repaints only the parts of the dashboard that changed
+		self.prefetchSongs = []					# playlist indexes whose pad grid is pre-rendered when idle
+		self.tap = TapTempo(self.referenceTempo)
+		self.lastOverlayTime = 0.0
+		self.on_handled = None
+
+		# MIDI messages arrive in the input thread of mido/rtmidi: they are translated there into
+		# main loop events, and a MIDI_EVENT is posted to pygame to wake up the main loop
+		self.MIDI_EVENT = pygame.event.custom_type()
+
+	def on_midi_message(self, message):
+		if message.type == 'note_on' and message.velocity > 0:
+			try:
+				lst = noteOnMapping [message.note]
+				self.eq.record_event("note on", lst)
+			except KeyError:
+				return
+		elif message.type == 'control_change':
+			try:
+				lst = ccMapping [message.control][:]	#[:] will force a copy of the list, otherwise the reference only is copied
+				lst.append (str(message.value))
+				self.eq.record_event("cc", lst)
+			except KeyError:
+				return
+		else:
+			return
+		self.wake()
+
+	def wake(self):
+		try:
+			pygame.event.post(pygame.event.Event(self.MIDI_EVENT))
+		except pygame.error:
+			pass		# pygame is shutting down
+
+	def stop(self):
+		"""End run() (from any thread)."""
+		self.running = False
+		self.wake()
+
+	def run(self):
+		# force default volume
+		self.player.set_master_volume(self.audioVolume)
+		# force display of 1st song in playlist and video
+		self.eq.record_event("cc", ["playlist","0"])
+		print (f"ready to play after {time.monotonic() - self.startTime:.2f} s")
+
+		while self.running:
+			self.step()
+
+	def step(self):
+		"""One pass of the main loop: wait for something to happen, handle it, redraw."""
+		eq, renderer = self.eq, self.renderer
+
+		# Sleep until something happens: a key, a MIDI message (MIDI_EVENT), a pending redraw
+		# or the next overlay refresh. Events already queued are handled without waiting
+		if eq.is_empty() and self.prefetchSongs and not renderer.due():
+			# idle: pre-render the pads of a song next to the current one, then check for events without waiting
+			idx = self.prefetchSongs.pop (0)
+			if idx < len (self.playList):
+				self.dashboard.grids.prefetch (song_squares (self.playList [idx]))
+			events = pygame.event.get()
+		elif eq.is_empty():
+			timeouts = []
+			if renderer.timeout() is not None:
+				timeouts.append (renderer.timeout())
+			if showTimingOverlay:
+				timeouts.append (self.lastOverlayTime + 1.0 - time.monotonic())
+			if timeouts:
+				timeout = max (0, int (min (timeouts) * 1000)) + 1	# ms, rounded up
+			else:
+				timeout = 0		# no timeout: wait for an event
+			events = [pygame.event.wait(timeout)] + pygame.event.get()
+		else:
+			events = pygame.event.get()
 
-		avg = statistics.median(intervals)
-		tapped_bpm = 60.0 / avg
+		# Handle Pygame events
+		for event in events:
+			if event.type == pygame.QUIT:
+				self.running = False
 
-		return tapped_bpm / self.reference_bpm
+			elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+				self.running = False
 
+		# Handle main loop events
+		# all the queued events at once: pads first, then the latest value of each knob
+		for next_event in eq.drain():
+			try:
+				self.handle_event(next_event)
+			except queue.Full:							# sequencer thread stalled: the show goes on
+				print ("player busy, event dropped:", next_event.label, next_event.values)
+			if self.on_handled is not None:
+				self.on_handled(next_event, time.monotonic() - next_event.time)
+
+		# refresh timing overlay
+		if showTimingOverlay and time.monotonic() - self.lastOverlayTime > 1.0:
+			self.lastOverlayTime = time.monotonic()
+			renderer.mark ("overlay")
+
+		# redraw what changed, once per frame at most
+		if renderer.due():
+			renderer.render (self.render_dashboard)
+
+	def handle_event(self, next_event):
+		player, renderer, playList = self.player, self.renderer, self.playList
+
+		# new playlist from the background Drive sync, swapped in between two events
+		if next_event.label == "sync":
+			if next_event.values [1]:
+				self.playList = next_event.values [1]
+				self.playListIndex = min (self.playListIndex, len (self.playList) - 1)
+				player.preload (song_pad_paths (self.playList, self.playListIndex, asset_path=self.assetPath))
+				renderer.mark ("pads", "songs")
+				self.prefetch_neighbours()
+				print ("playlist updated:", len (self.playList), "songs")
+
+		# note on events
+		if next_event.label == "note on":
+			# stop
+			if next_event.values [0] == "stop":
+				print ("stop")
+				player.stop()
+				renderer.mark ("pads")
+
+			# tap tempo
+			if next_event.values [0] == "tap tempo":
+				print ("tap")
+				tapped = self.tap.tap()
+				if tapped is not None:
+					self.tapTempoRatio, beatTime = tapped
+					self.tempoRatio = clamp_speed (self.tapTempoRatio)
+					player.align_beat(beatTime, self.tempoRatio)		# new tempo, and the loop moves onto the tapped beats
+					renderer.mark ("tempo")
+
+			# pad
+			if next_event.values [0] == "pad":
+				padNumber = int (next_event.values [1])				# get pad number
+				pads = playList [self.playListIndex].pads			# list of pads for the current song
+
+				if (padNumber < len (pads)):						# make sure the pressed pad is specified in json as a pad
+					#color = color_as_int (pads [padNumber].color)
+					midiFile = self.assetPath + "/" + playList [self.playListIndex].path + pads [padNumber].file
+					print ("playing :" + midiFile)
+					try:
+						# the sound changes with the pad, at the switch (the playing pad keeps its own until then)
+						self.referenceTempo = player.play(midiFile, loop=True, program=(0, soundMapping [self.soundName]))
+					except OSError as e:						# e.g. file being replaced by the Drive sync
+						print ("cannot play " + midiFile + ":", e)
+						return
+					if self.firstNoteTime is None:
+						self.firstNoteTime = time.monotonic() - self.startTime
+						print (f"time to first note: {self.firstNoteTime:.2f} s")
+					self.tap = TapTempo(self.referenceTempo)
+					renderer.mark ("pads", "tempo")					# display pad that is playing
+
+		# cc events
+		if next_event.label == "cc":
+			# volume
+			if next_event.values [0] == "volume":
+				vol = float (next_event.values [1])					# velocity between 0-127
+				vol = vol / 127.0									# volume between 0.0-1.0
+				self.audioVolume = vol
+				player.set_master_volume(self.audioVolume)
+				renderer.mark ("volume")							# display new volume
+
+			# tempo
+			if next_event.values [0] == "tempo":
+				temp = float (next_event.values [1])				# velocity between 0-127
+				temp = (temp / 127.0) * 0.2							# tempo increment between 0.0-0.2
+				temp = temp - 0.1									# tempo increment between -0.1 and +0.1
+				self.knobTempoRatio = temp
+				if self.tapTempoRatio is not None:
+					self.tempoRatio = clamp_speed (self.tapTempoRatio + self.knobTempoRatio)
+				else:
+					self.tempoRatio = clamp_speed (1.0 + self.knobTempoRatio)
+				player.ramp_speed (self.tempoRatio, tempoKnobRampBeats)	# assign new tempo, smoothly
+				renderer.mark ("tempo")								# display new tempo
+
+			# playlist
+			if next_event.values [0] == "playlist":
+				idx = float (next_event.values [1])					# velocity between 0-127
+				idx = int ((idx * len (playList)) / 127.0)			# index in playlist is between 0 and length of playlist
+				idx = max (idx, 0)									# avoid negative values
+				idx = min (idx, len(playList) - 1)					# avoid values >= length of playlist
+				self.playListIndex = idx
+				self.soundName = playList [self.playListIndex].sound
+				player.preload (song_pad_paths (playList, self.playListIndex, asset_path=self.assetPath))	# prepare pads before they are hit
+				renderer.mark ("pads", "songs", "sound")			# display new song names
+				self.prefetch_neighbours()
+
+			# sound
+			if next_event.values [0] == "sound":
+				snd = float (next_event.values [1])					# velocity between 0-127
+				snd = int ((snd * len (soundMapping)) / 127.0) 		# index in soundfont is between 0 and length of dictionary
+				snd = max (snd, 0)									# avoid negative values
+				snd = min (snd, len(soundMapping) - 1)				# avoid values >= length of dictionary
+				for k, v in soundMapping.items():
+					if v == snd:
+						self.soundName = k
+						break
+				#player.set_instrument(channel=0, bank=0, preset=40)
+				player.set_all_instruments(bank=0, preset=soundMapping [self.soundName], skip_drums=True)
+				renderer.mark ("sound")								# display new sound
+
+	# songs around the current one, nearest first: their pads are drawn ahead for a fast playlist scroll
+	def prefetch_neighbours(self, neighbours=2):
+		self.prefetchSongs = []
+		for d in range (1, neighbours + 1):
+			for idx in (self.playListIndex + d, self.playListIndex - d):
+				if 0 <= idx < len (self.playList):
+					self.prefetchSongs.append (idx)
+
+	# redraw the dashboard (called by the render scheduler, at most displayFps times per second)
+	def render_dashboard(self, dirty):
+		playList, playListIndex = self.playList, self.playListIndex
+		squares = song_squares (playList [playListIndex])
+		# define song names
+		previousSoung = playList [playListIndex - 1].song if playListIndex > 0 else ""
+		nextSong = playList [playListIndex + 1].song if playListIndex < (len (playList) - 1) else ""
+		currentSong = playList [playListIndex].song
+
+		overlay = None
+		if showTimingOverlay:
+			overlay = self.renderer.summary_line()
+			if hasattr (self.player, "timing"):
+				overlay = self.player.timing.summary_line() + " | " + overlay
+
+		rects = self.dashboard.draw(
+			screen=self.screen,
+			squares=squares,
+			volume_percent=self.audioVolume,
+			tempo_bpm=int (self.referenceTempo * self.tempoRatio),
+			sound=self.soundName,
+			prev_song=previousSoung,
+			current_song=currentSong,
+			next_song=nextSong,
+			overlay=overlay
+		)
+		if rects:
+			pygame.display.update(rects)		# push the changed parts only
+
+
+# records the controller session, one JSON line per MIDI message: {"t": seconds since start, "msg": message as a dict}
+class SessionRecorder:
+	def __init__(self, file_path):
+		self.file = open(file_path, "w", encoding="utf-8")
+		self.start = time.monotonic()
+		self.lock = threading.Lock()
+
+	def record(self, message):
+		line = json.dumps({"t": round(time.monotonic() - self.start, 4), "msg": message.dict()})
+		with self.lock:
+			self.file.write(line + "\n")
+
+	def close(self):
+		with self.lock:
+			self.file.close()
 
 
-	
 ########
 # MAIN #
 ########
 
-# get latest playlist and midi files from google drive (public access)
-API_KEY = os.environ["GOOGLE_API_KEY"]  # GOOGLE_API_KEY is an environment variable where the key is stored
-
-path = update.download_public_drive_folder(
-	"https://drive.google.com/drive/folders/1io1W0YnH7mI1X7S5Q3wC6OUZZVxWNRpT",
-	api_key=API_KEY,
-	dest_root="./",
-	timeout_sec=10,
-)
-
-
-if path is None:
-	print("Drive folder not downloaded (offline/timeout/not public/not a folder). Continuing…")
-else:
-	print("Downloaded to:", path)
-
-# Create a list of Song objects from playlist.json
-playList = song.load_song_configs_from_file(assetPath + "/playlist.json")
-
-first = playList[0]
-print(first.song, first.tempo, first.sound, first.path)
-
-for pad in first.pads:
-	print(pad.name, pad.color, pad.file, pad.color_as_int())
-
-
-# Pygame init (we'll create a tiny hidden window so the event loop works)
-pygame.init()
-eventScreen = pygame.display.set_mode((1, 1))  					# no UI; just to pump events
-pygame.display.set_caption("MIDI Event Loop")
-
-# Create windows
-os.environ['SDL_VIDEO_WINDOW_POS'] = '%i, %i' % (0, 0)			# force window positionning to primary display at 0,0
-screen = pygame.display.set_mode((480, 320), pygame.NOFRAME)	# fixed display size 480 x 320
-# force all inputs to be in the pygame window, and hide mouse
-pygame.mouse.set_visible (False)
-pygame.event.set_grab (True)
-
-# Open player & load soundfont
-player = fluid_player.LiveFsPlayer("autobass.sf2", "alsa", "default")
-
-# List all available MIDI input devices
-print("Available MIDI input devices:")
-for i, name in enumerate(mido.get_input_names()):
-	if "LPD8 mk2" in name:				 # entry device fixed at AKAI LPD8 mk2
-		input_device_name = name
-	print(f"{i}: {name}")
-
-# Initialize the input port
-input_port = mido.open_input(input_device_name)
-print(f"Listening on {input_device_name}...")
-
-# Set event queue
-eq = EventQueue()		# event queue to manage the events happening in the main loop
-
-# force default volume
-player.set_master_volume(audioVolume)
-# force display of 1st song in playlist and video
-eq.record_event("cc", ["playlist","0"])
-tap = TapTempo(referenceTempo)
-
-
-try:
-	while running:
-
-		# Handle Pygame events
-		for event in pygame.event.get():
-			if event.type == pygame.QUIT:
-				running = False
-
-			elif event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-				running = False
-
-		# Handle midi events
-		while input_port.poll():
-			message = input_port.receive()  # Get the message if available
-
-			if message.type == 'note_on' and message.velocity > 0:
-				try:
-					lst = noteOnMapping [message.note]
-					eq.record_event("note on", lst)
-				except KeyError:
-					pass
-			elif message.type == 'control_change':
-				try:
-					lst = ccMapping [message.control][:]	#[:] will force a copy of the list, otherwise the reference only is copied
-					lst.append (str(message.value))
-					eq.record_event("cc", lst)
-				except KeyError:
-					pass
-
-		# Handle main loop events
-		next_event = eq.get_next_event()
-		if next_event:		# make sure there is an event to process
-
-			# display events
-			if next_event.label == "display":
-				squares = []
-				square = {}
-				# define pads to be displayed
-				for i in range (0,6):
-					square = {}
-					try:
-						square ["text"] = playList [playListIndex].pads [i].name
-						square ["color"] = playList [playListIndex].pads [i].color_as_tuple()
-					except Exception as e:
-						square ["text"] = ""
-						square ["color"] = (128,128,128)		# gray pads if not defined
-					squares.append (square)
-				# define song names
-				previousSoung = playList [playListIndex - 1].song if playListIndex > 0 else ""
-				nextSong = playList [playListIndex + 1].song if playListIndex < (len (playList) - 1) else ""
-				currentSong = playList [playListIndex].song
-				
-				draw.draw_dashboard(
-					screen=screen,
-					squares=squares,
-					volume_percent=audioVolume,
-					tempo_bpm=int (referenceTempo * tempoRatio),
-					sound=soundName,
-					prev_song=previousSoung,
-					current_song=currentSong,
-					next_song=nextSong
-				)				
-				pygame.display.flip()
-
-			# note on events
-			if next_event.label == "note on":
-				# stop
-				if next_event.values [0] == "stop":
-					print ("stop")
-					player.stop()
-					eq.record_event("display", [])
-
-				# tap tempo
-				if next_event.values [0] == "tap tempo":
-					print ("tap")
-					tapTempoRatio = tap.tap()
-					if tapTempoRatio is not None:
-						tempoRatio = tapTempoRatio
-						player.set_speed(tempoRatio)
-		
-				# pad
-				if next_event.values [0] == "pad":
-					padNumber = int (next_event.values [1])			# get pad number
-					pads = playList [playListIndex].pads			# list of pads for the current song
-					
-					if (padNumber < len (pads)):					# make sure the pressed pad is specified in json as a pad
-						#color = color_as_int (pads [padNumber].color)
-						print ("playing :" + assetPath + "/" + playList [playListIndex].path + pads [padNumber].file)
-						player.set_all_instruments(bank=0, preset=soundMapping [soundName], skip_drums=True)
-						referenceTempo = player.play(assetPath + "/" + playList [playListIndex].path + pads [padNumber].file, loop=True)
-						tap = TapTempo(referenceTempo)
-						eq.record_event ("display", [])				# display pad that is playing
-
-			# cc events
-			if next_event.label == "cc":
-				# volume
-				if next_event.values [0] == "volume":
-					vol = float (next_event.values [1])				# velocity between 0-127
-					vol = vol / 127.0								# volume between 0.0-1.0
-					audioVolume = vol
-					player.set_master_volume(audioVolume)
-					eq.record_event ("display", [])					# display new volume
-
-				# tempo
-				if next_event.values [0] == "tempo":
-					temp = float (next_event.values [1])			# velocity between 0-127
-					temp = (temp / 127.0) * 0.2						# tempo increment between 0.0-0.2
-					temp = temp - 0.1								# tempo increment between -0.1 and +0.1
-					knobTempoRatio = temp
-					if tapTempoRatio is not None:
-						tempoRatio = tapTempoRatio + knobTempoRatio
-					else:
-						tempoRatio = 1.0 + knobTempoRatio
-					player.set_speed (tempoRatio)					# assign new tempo
-					eq.record_event ("display", [])					# display new tempo
-
-				# playlist
-				if next_event.values [0] == "playlist":
-					idx = float (next_event.values [1])				# velocity between 0-127
-					idx = int ((idx * len (playList)) / 127.0)		# index in playlist is between 0 and length of playlist
-					idx = max (idx, 0)								# avoid negative values
-					idx = min (idx, len(playList) - 1)				# avoid values >= length of playlist
-					playListIndex = idx
-					soundName = playList [playListIndex].sound
-					eq.record_event ("display", [])					# display new song names
-
-				# sound
-				if next_event.values [0] == "sound":
-					snd = float (next_event.values [1])				# velocity between 0-127
-					snd = int ((snd * len (soundMapping)) / 127.0) 	# index in soundfont is between 0 and length of dictionary
-					snd = max (snd, 0)								# avoid negative values
-					snd = min (snd, len(soundMapping) - 1)			# avoid values >= length of dictionary
-					for k, v in soundMapping.items():
-						if v == snd:
-							soundName = k
-							break
-					#player.set_instrument(channel=0, bank=0, preset=40)
-					player.set_all_instruments(bank=0, preset=soundMapping [soundName], skip_drums=True)
-					eq.record_event ("display", [])					# display new sound
-
-		# Keep loop responsive
-		pygame.time.wait(30)
-
-
-except KeyboardInterrupt:
-    print("Exiting...")
-
-
-finally:
-	# Cleanup
-	# stop audio
-	player.stop()
-	input_port.close()  # Ensure that the midi port is closed on exit
-	# Disable input grabbing before exiting
-	pygame.event.set_grab(False)
-	pygame.mouse.set_visible (True)
-	pygame.quit()
+# get latest playlist and midi files from google drive (only what changed), then hand the new playlist to the app
+def sync_playlist(app=None):
+	import update		# the google api client is imported by update only when syncing
+
+	API_KEY = os.environ.get("GOOGLE_API_KEY")  # GOOGLE_API_KEY is an environment variable where the key is stored
+	if not API_KEY:
+		print("GOOGLE_API_KEY not set: playlist not synchronized")
+		return
+
+	result = update.sync_public_drive_folder(
+		driveFolderUrl,
+		api_key=API_KEY,
+		dest_root="./",
+		timeout_sec=10,
+	)
+
+	if result is None:
+		print("Drive folder not synchronized (offline/timeout/not public/not a folder). Continuing…")
+		return
+	print(f"Synchronized {result.path}: {result.downloaded} downloaded ({result.bytes} bytes), {result.deleted} deleted, {result.unchanged} unchanged")
+
+	if app is not None and result.changed:
+		try:
+			playList = song.load_song_configs_from_file(assetPath + "/playlist.json")
+		except (OSError, ValueError, KeyError) as e:
+			print("new playlist not loaded:", e)
+			return
+		app.eq.record_event("sync", ["playlist", playList])
+		app.wake()
+
+
+def main():
+	# start from the local playlist right away, the Drive sync runs in the background once the app is up;
+	# the very first time (nothing local yet), wait for the download
+	syncInBackground = os.path.exists(assetPath + "/playlist.json")
+	if not syncInBackground:
+		sync_playlist()
+
+	# Create a list of Song objects from playlist.json
+	playList = song.load_song_configs_from_file(assetPath + "/playlist.json")
+
+	first = playList[0]
+	print(first.song, first.tempo, first.sound, first.path)
+
+	for pad in first.pads:
+		print(pad.name, pad.color, pad.file, pad.color_as_int())
+
+
+	# Pygame init (we'll create a tiny hidden window so the event loop works)
+	pygame.init()
+	eventScreen = pygame.display.set_mode((1, 1))  					# no UI; just to pump events
+	pygame.display.set_caption("MIDI Event Loop")
+
+	# Create windows
+	os.environ['SDL_VIDEO_WINDOW_POS'] = '%i, %i' % (0, 0)			# force window positionning to primary display at 0,0
+	screen = pygame.display.set_mode((480, 320), pygame.NOFRAME)	# fixed display size 480 x 320
+	# force all inputs to be in the pygame window, and hide mouse
+	pygame.mouse.set_visible (False)
+	pygame.event.set_grab (True)
+
+	# Open player & load soundfont
+	if playbackEngine == "pcm":
+		player = loop_cache.PcmLoopEngine(soundfontPath)
+	else:
+		player = fluid_player.LiveFsPlayer(soundfontPath, "alsa", "default", backend=playbackBackend, lazy_samples=lazySampleLoading, audio_profile=audioProfilePath)
+	player.quantize = launchQuantize
+
+	app = AutoBass(playList, player, screen, start_time=startTime)
+
+	# List all available MIDI input devices
+	print("Available MIDI input devices:")
+	for i, name in enumerate(mido.get_input_names()):
+		if "LPD8 mk2" in name:				 # entry device fixed at AKAI LPD8 mk2
+			input_device_name = name
+		print(f"{i}: {name}")
+
+	# Initialize the input port
+	recorder = SessionRecorder(sessionRecordPath) if sessionRecordPath else None
+	def on_message(message):
+		if recorder is not None:
+			recorder.record(message)
+		app.on_midi_message(message)
+	input_port = mido.open_input(input_device_name, callback=on_message)
+	print(f"Listening on {input_device_name}...")
+
+
+	if syncInBackground:
+		threading.Thread(target=sync_playlist, args=(app,), daemon=True).start()
+
+	try:
+		app.run()
+
+	except KeyboardInterrupt:
+	    print("Exiting...")
+
+
+	finally:
+		# Cleanup
+		# stop audio
+		player.close()
+		# keep playback timing stats of the show
+		if timingDumpPath and hasattr (player, "timing"):
+			player.timing.dump(timingDumpPath)
+		print ("display:", app.renderer.summary_line())
+		input_port.close()  # Ensure that the midi port is closed on exit
+		if recorder is not None:
+			recorder.close()
+		# Disable input grabbing before exiting
+		pygame.event.set_grab(False)
+		pygame.mouse.set_visible (True)
+		pygame.quit()
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,156 @@
+# bench_playback.py
+# Latency and timing benchmark of the playback path, with a fake synth (no sound card needed).
+#
+#   python bench_playback.py              # full run
+#   python bench_playback.py --quick      # fewer trials, shorter playback
+#
+# For each synthetic MIDI file (increasing note density) it reports:
+#   pad->sound   time from the pad handler (set_all_instruments + play) to the first noteon
+#   event error  recorded event time minus the time the MIDI file asks for
+#   loop gap     error of the interval between the last event of a pass and the first of the next
+#   stop         time from stop() to the last note-off sent
+#   cpu          process CPU seconds per second of playback
+import argparse
+import os
+import tempfile
+import threading
+import time
+
+import mido
+
+import fake_synth
+import fluid_player
+from event_stream import OP_NOTE_ON, OP_NOTE_OFF, OP_CONTROL_CHANGE
+
+OP_KIND = {OP_NOTE_ON: "note_on", OP_NOTE_OFF: "note_off", OP_CONTROL_CHANGE: "control_change"}
+
+
+def make_midi(path, notes_per_beat, beats=8, bpm=120, chord=1, ticks_per_beat=480):
+	"""Write a 4/4 bass-like file: `notes_per_beat` notes of `chord` voices per beat, first note at 0."""
+	mid = mido.MidiFile(ticks_per_beat=ticks_per_beat)
+	track = mido.MidiTrack()
+	mid.tracks.append(track)
+	track.append(mido.MetaMessage("set_tempo", tempo=mido.bpm2tempo(bpm)))
+	track.append(mido.MetaMessage("time_signature", numerator=4, denominator=4))
+	step = ticks_per_beat // notes_per_beat
+	gate = max(1, step * 3 // 4)
+	for n in range(beats * notes_per_beat):
+		root = 36 + (n * 5) % 24
+		for v in range(chord):
+			track.append(mido.Message("note_on", note=root + 7 * v, velocity=100, time=0))
+		for v in range(chord):
+			track.append(mido.Message("note_off", note=root + 7 * v, velocity=0, time=gate if v == 0 else 0))
+		track.append(mido.Message("control_change", control=11, value=(n * 7) % 128, time=step - gate))
+	mid.save(path)
+
+
+def percentile(values, p):
+	if not values:
+		return 0.0
+	values = sorted(values)
+	return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def summary(values):
+	return percentile(values, 50), percentile(values, 99), max(values) if values else 0.0
+
+
+def bench_pad_latency(player, synth, midi_path, trials):
+	latencies = []
+	for _ in range(trials):
+		player.stop()
+		time.sleep(0.02)
+		first = []
+		got = threading.Event()
+
+		def on_event(event):
+			if event[1] == "note_on" and not got.is_set():
+				first.append(event[0])
+				got.set()
+
+		synth.on_event = on_event
+		t0 = time.monotonic()
+		player.set_all_instruments(bank=0, preset=6, skip_drums=True)
+		player.play(midi_path, loop=True)
+		if got.wait(1.0):
+			latencies.append(first[0] - t0)
+		synth.on_event = None
+	player.stop()
+	time.sleep(0.02)
+	return latencies
+
+
+def bench_timing(player, synth, midi_path, loops, speed):
+	stream = player.pad_cache.get_or_prepare(midi_path).stream
+	player.set_speed(speed)
+	time.sleep(0.01)
+	synth.clear()
+
+	wall0, cpu0 = time.monotonic(), time.process_time()
+	player.play(midi_path, loop=True)
+	time.sleep(loops * stream.length / speed + 0.05)
+	wall, cpu = time.monotonic() - wall0, time.process_time() - cpu0
+
+	stop_at = time.monotonic()
+	player.stop()
+	time.sleep(0.05)
+	after_stop = [e[0] for e in synth.events if e[0] >= stop_at]
+	stop_latency = (max(after_stop) - stop_at) if after_stop else 0.0
+
+	# match recorded events against the file, pass after pass
+	recorded = [e for e in synth.events if e[0] < stop_at]
+	count = len(stream)
+	errors, gaps = [], []
+	if recorded and count:
+		t_first = recorded[0][0] - stream.times[0] / speed
+		for k, event in enumerate(recorded[:loops * count]):
+			n, i = divmod(k, count)
+			if event[1] != OP_KIND[stream.ops[i]]:
+				break
+			expected = t_first + (n * stream.length + stream.times[i]) / speed
+			errors.append(event[0] - expected)
+			if i == 0 and n > 0:
+				expected_gap = (stream.length - stream.times[-1] + stream.times[0]) / speed
+				gaps.append(abs((event[0] - recorded[k - 1][0]) - expected_gap))
+
+	player.set_speed(1.0)
+	return [abs(e) for e in errors], gaps, stop_latency, cpu / wall
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmark pad latency and event timing of LiveFsPlayer.")
+	parser.add_argument("--quick", action="store_true", help="fewer trials and loop passes")
+	args = parser.parse_args()
+	trials, loops = (10, 2) if args.quick else (50, 4)
+
+	densities = [(1, 1), (4, 1), (8, 2), (16, 3)]		# (notes per beat, voices)
+	with tempfile.TemporaryDirectory() as tmp:
+		synth = fake_synth.RecordingSynth()
+		player = fluid_player.LiveFsPlayer("autobass.sf2", audio_driver=None, synth=synth)
+		try:
+			print(f"{'file':<14}{'events':>7} | {'pad->sound ms p50/p99/max':>26} | {'event error ms p50/p99/max':>27} | {'loop gap ms':>11} | {'stop ms':>7} | {'cpu':>6}")
+			for notes_per_beat, chord in densities:
+				path = os.path.join(tmp, f"d{notes_per_beat}x{chord}.mid")
+				make_midi(path, notes_per_beat, beats=4 if args.quick else 8, chord=chord)
+				events = len(player.pad_cache.get_or_prepare(path).stream)
+
+				lat = bench_pad_latency(player, synth, path, trials)
+				errors, gaps, stop_latency, cpu = [], [], 0.0, 0.0
+				for speed in (1.0, 1.37):
+					e, g, s, c = bench_timing(player, synth, path, loops, speed)
+					errors += e
+					gaps += g
+					stop_latency = max(stop_latency, s)
+					cpu = max(cpu, c)
+
+				l50, l99, lmax = (v * 1000 for v in summary(lat))
+				e50, e99, emax = (v * 1000 for v in summary(errors))
+				gmax = max(gaps) * 1000 if gaps else 0.0
+				name = f"{notes_per_beat}/beat x{chord}"
+				print(f"{name:<14}{events:>7} | {l50:8.3f} {l99:8.3f} {lmax:8.3f} | {e50:8.3f} {e99:8.3f} {emax:9.3f} | {gmax:11.3f} | {stop_latency * 1000:7.3f} | {cpu:5.1%}")
+		finally:
+			player.close()
+
+
+if __name__ == "__main__":
+	main()
@@ -1,4 +1,7 @@
 # draw.py
+import functools
+from collections import OrderedDict
+
 import pygame
 
 # ============================================================
@@ -17,10 +20,17 @@ INFO_FONT_NAME = "Consolas"
 INFO_FONT_SIZE = 24
 INFO_FONT_COLOR = (0, 0, 0)
 
+# Timing overlay (small text line at the top of the screen)
+OVERLAY_FONT_SIZE = 14
+OVERLAY_COLOR = (200, 0, 0)
+
 # Bottom text layout (easy to change)
 BOTTOM_TEXT_BLOCK_VPAD = 4	 # padding above/below the 2-line block inside bottom area
 BOTTOM_TEXT_LEADING = 4		# extra pixels between the two lines (interline)
 
+# Pre-rendered pad grids kept (one per song shown or prefetched, about 0.5 MB each)
+PAD_GRID_CACHE_SIZE = 8
+
 # Colors
 WHITE = (255, 255, 255)
 BLACK = (0, 0, 0)
@@ -49,16 +59,24 @@ def _wrap_text_to_width(text, font, max_width):
 	return lines
 
 
-def _fit_font_for_text(text, font_name, rect, max_size=52, min_size=8, padding=6):
-	avail_w = max(1, rect.w - 2 * padding)
-	avail_h = max(1, rect.h - 2 * padding)
+@functools.lru_cache(maxsize=None)
+def _font(font_name, size):
+	# SysFont searches the system fonts (slow on a Pi): each (name, size) is built once
+	return pygame.font.SysFont(font_name, size)
+
+
+@functools.lru_cache(maxsize=512)
+def _fit_layout(text, font_name, w, h, max_size=52, min_size=8, padding=6):
+	"""Largest font size for text to fit in a w x h box, and the wrapped lines: (size, lines)."""
+	avail_w = max(1, w - 2 * padding)
+	avail_h = max(1, h - 2 * padding)
 
 	lo, hi = min_size, max_size
 	best = min_size
 
 	while lo <= hi:
 		mid = (lo + hi) // 2
-		font = pygame.font.SysFont(font_name, mid)
+		font = _font(font_name, mid)
 		lines = _wrap_text_to_width(text, font, avail_w)
 
 		widest = max(font.size(line)[0] for line in lines) if lines else 0
@@ -70,7 +88,14 @@ def _fit_font_for_text(text, font_name, rect, max_size=52, min_size=8, padding=6
 		else:
 			hi = mid - 1
 
-	return pygame.font.SysFont(font_name, best)
+	return best, tuple(_wrap_text_to_width(text, _font(font_name, best), avail_w))
+
+
+def clear_caches():
+	"""Forget cached fonts and layouts (needed after pygame.font.quit())."""
+	_font.cache_clear()
+	_fit_layout.cache_clear()
+	_layout.cache_clear()
 
 
 def _render_multiline_centered(surface, lines, font, color, rect):
@@ -132,18 +157,9 @@ def _draw_justified_triplet(surface, y, line_rect, font, color, left, center, ri
 		surface.blit(img, img_rect)
 
 
-def draw_dashboard(
-	screen: pygame.Surface,
-	squares,				 # list of 6 items: dicts or tuples
-	volume_percent: float,
-	tempo_bpm: int,
-	sound: str,
-	prev_song: str,
-	current_song: str,
-	next_song: str,
-):
-	screen.fill(WHITE)
-
+@functools.lru_cache(maxsize=1)
+def _layout():
+	"""Rectangles of the dashboard parts (they only depend on the config above and the info font)."""
 	usable = pygame.Rect(
 		OUTER_MARGIN,
 		OUTER_MARGIN,
@@ -158,16 +174,52 @@ def draw_dashboard(
 	top_rect = pygame.Rect(usable.x, usable.y, usable.w, top_h)
 	bottom_rect = pygame.Rect(usable.x, usable.y + top_h, usable.w, bottom_h)
 
-	pygame.draw.line(screen, (220, 220, 220), (usable.x, bottom_rect.y), (usable.right, bottom_rect.y), 1)
-
-	# ============================================================
-	# TOP PART: 6 squares (2 rows x 3 cols)
-	# ============================================================
+	# ---- TOP PART: 6 squares (2 rows x 3 cols) ----
 	rows, cols = GRID_ROWS, GRID_COLS
-	total = rows * cols  # = 6
+	sq_w = (top_rect.w - (cols + 1) * GRID_GAP) // cols
+	sq_h = (top_rect.h - (rows + 1) * GRID_GAP) // rows
+	sq_w = max(1, sq_w)
+	sq_h = max(1, sq_h)
+
+	pads = []
+	for r in range(rows):
+		for c in range(cols):
+			x = top_rect.x + GRID_GAP + c * (sq_w + GRID_GAP)
+			y = top_rect.y + GRID_GAP + r * (sq_h + GRID_GAP)
+			pads.append(pygame.Rect(x, y, sq_w, sq_h))
+
+	# ---- BOTTOM PART: 2 lines of justified text (VERTICALLY CENTERED) ----
+	line_h = _font(INFO_FONT_NAME, INFO_FONT_SIZE).get_linesize()
+
+	# Total height of the 2-line block including extra leading between lines
+	block_h = (2 * line_h) + BOTTOM_TEXT_LEADING
+
+	# Compute y start so the block is vertically centered within bottom_rect
+	# while keeping a small vertical padding inside the bottom area.
+	inner = bottom_rect.inflate(0, -2 * BOTTOM_TEXT_BLOCK_VPAD)
+	if inner.h <= 0:
+		inner = bottom_rect  # fallback
+
+	y_start = inner.y + (inner.h - block_h) // 2
+
+	# ---- OPTIONAL OVERLAY: 1 small line on top of the squares ----
+	overlay_h = _font(INFO_FONT_NAME, OVERLAY_FONT_SIZE).get_linesize()
+
+	return {
+		"usable": usable,
+		"separator": ((usable.x, bottom_rect.y), (usable.right, bottom_rect.y)),
+		"pads": pads,
+		"grid": pads[0].unionall(pads[1:]),
+		"info": pygame.Rect(bottom_rect.x, y_start, bottom_rect.w, line_h),
+		"songs": pygame.Rect(bottom_rect.x, y_start + line_h + BOTTOM_TEXT_LEADING, bottom_rect.w, line_h),
+		"overlay": pygame.Rect(usable.x, usable.y, usable.w, overlay_h),
+	}
 
-	norm = []
-	for i in range(total):
+
+def _dashboard_state(squares, volume_percent, tempo_bpm, sound, prev_song, current_song, next_song, overlay):
+	"""What each part of the dashboard shows: {part: inputs}."""
+	state = {}
+	for i in range(GRID_ROWS * GRID_COLS):
 		if i < len(squares):
 			item = squares[i]
 			if isinstance(item, dict):
@@ -180,62 +232,166 @@ def draw_dashboard(
 				tc = item[2] if len(item) > 2 else None
 		else:
 			txt, bg, tc = "", (200, 200, 200), None
-		norm.append((txt, bg, tc))
+		state[("pad", i)] = (txt, tuple(bg), tuple(tc) if tc is not None else None)
+	state["info"] = (f"volume {volume_percent * 100:.0f}%", f"{tempo_bpm} BPM", sound)
+	state["songs"] = (prev_song, current_song, next_song)
+	state["overlay"] = overlay or None
+	return state
 
-	sq_w = (top_rect.w - (cols + 1) * GRID_GAP) // cols
-	sq_h = (top_rect.h - (rows + 1) * GRID_GAP) // rows
-	sq_w = max(1, sq_w)
-	sq_h = max(1, sq_h)
 
-	idx = 0
-	for r in range(rows):
-		for c in range(cols):
-			x = top_rect.x + GRID_GAP + c * (sq_w + GRID_GAP)
-			y = top_rect.y + GRID_GAP + r * (sq_h + GRID_GAP)
-			rect = pygame.Rect(x, y, sq_w, sq_h)
+def _part_rect(layout, part):
+	return layout["pads"][part[1]] if isinstance(part, tuple) else layout[part]
 
-			txt, bg, tc = norm[idx]
-			idx += 1
 
-			pygame.draw.rect(screen, bg, rect, border_radius=6)
+def _draw_pad(surface, rect, inputs):
+	txt, bg, tc = inputs
+	pygame.draw.rect(surface, bg, rect, border_radius=6)
 
-			if tc is None:
-				tc = BLACK if _relative_luminance(bg) > 140 else WHITE
+	if tc is None:
+		tc = BLACK if _relative_luminance(bg) > 140 else WHITE
 
-			font = _fit_font_for_text(txt, SQUARE_FONT_NAME, rect, max_size=52, min_size=8, padding=6)
-			lines = _wrap_text_to_width(txt, font, rect.w - 12)
-			_render_multiline_centered(screen, lines, font, tc, rect)
+	size, lines = _fit_layout(txt, SQUARE_FONT_NAME, rect.w, rect.h, max_size=52, min_size=8, padding=6)
+	_render_multiline_centered(surface, lines, _font(SQUARE_FONT_NAME, size), tc, rect)
 
-	# ============================================================
-	# BOTTOM PART: 2 lines of justified text (VERTICALLY CENTERED)
-	# ============================================================
-	info_font = pygame.font.SysFont(INFO_FONT_NAME, INFO_FONT_SIZE)
-	line_h = info_font.get_linesize()
 
-	# Total height of the 2-line block including extra leading between lines
-	block_h = (2 * line_h) + BOTTOM_TEXT_LEADING
+def _paint(screen, clip, state, layout, grid=None):
+	"""Repaint everything inside the clip rectangle, back to front (grid: pre-rendered pads)."""
+	screen.set_clip(clip)
+	screen.fill(WHITE, clip)
+	pygame.draw.line(screen, (220, 220, 220), *layout["separator"], 1)
+	if grid is not None and layout["grid"].colliderect(clip):
+		screen.blit(grid, layout["grid"])
 
-	# Compute y start so the block is vertically centered within bottom_rect
-	# while keeping a small vertical padding inside the bottom area.
-	inner = bottom_rect.inflate(0, -2 * BOTTOM_TEXT_BLOCK_VPAD)
-	if inner.h <= 0:
-		inner = bottom_rect  # fallback
+	for part, inputs in state.items():
+		rect = _part_rect(layout, part)
+		if part == "overlay" or not rect.colliderect(clip):
+			continue
 
-	y_start = inner.y + (inner.h - block_h) // 2
+		if isinstance(part, tuple):
+			if grid is None:
+				_draw_pad(screen, rect, inputs)
+		else:
+			_draw_justified_triplet(
+				screen, rect.y, rect, _font(INFO_FONT_NAME, INFO_FONT_SIZE), INFO_FONT_COLOR,
+				*inputs
+			)
 
-	# Build the line rectangles
-	line1_rect = pygame.Rect(bottom_rect.x, y_start, bottom_rect.w, line_h)
-	line2_rect = pygame.Rect(bottom_rect.x, y_start + line_h + BOTTOM_TEXT_LEADING, bottom_rect.w, line_h)
+	# the overlay is drawn over the squares
+	if state["overlay"] and layout["overlay"].colliderect(clip):
+		overlay_font = _font(INFO_FONT_NAME, OVERLAY_FONT_SIZE)
+		txt = _ellipsize(state["overlay"], overlay_font, layout["usable"].w - 4)
+		img = overlay_font.render(txt, True, OVERLAY_COLOR, WHITE)
+		screen.blit(img, (layout["usable"].x + 2, layout["usable"].y))
 
-	left1 = f"volume {volume_percent * 100:.0f}%"
-	center1 = f"{tempo_bpm} BPM"
-	right1 = sound
+	screen.set_clip(None)
 
-	_draw_justified_triplet(
-		screen, line1_rect.y, line1_rect, info_font, INFO_FONT_COLOR,
-		left1, center1, right1
-	)
-	_draw_justified_triplet(
-		screen, line2_rect.y, line2_rect, info_font, INFO_FONT_COLOR,
-		prev_song, current_song, next_song
-	)
+
+def draw_dashboard(
+	screen: pygame.Surface,
+	squares,				 # list of 6 items: dicts or tuples
+	volume_percent: float,
+	tempo_bpm: int,
+	sound: str,
+	prev_song: str,
+	current_song: str,
+	next_song: str,
+	overlay: str | None = None,	# optional debug line (e.g. playback timing stats)
+):
+	"""Draw the whole dashboard (see Dashboard to repaint only what changed)."""
+	state = _dashboard_state(squares, volume_percent, tempo_bpm, sound, prev_song, current_song, next_song, overlay)
+	_paint(screen, screen.get_rect(), state, _layout())
+
+
+class PadGridCache:
+	"""
+	Pre-rendered pad grids (the six pads of a song on their white background), least
+	recently used first out. Keyed by what the pads show, so any song with the same pads
+	shares its grid.
+	"""
+
+	def __init__(self, max_items: int = PAD_GRID_CACHE_SIZE):
+		self.max_items = max_items
+		self._grids = OrderedDict()
+		self.hits = self.misses = 0
+
+	@staticmethod
+	def key(squares):
+		state = _dashboard_state(squares, 0.0, 0, "", "", "", "", None)
+		return tuple(state[("pad", i)] for i in range(GRID_ROWS * GRID_COLS))
+
+	def get(self, key):
+		grid = self._grids.get(key)
+		if grid is not None:
+			self._grids.move_to_end(key)
+			self.hits += 1
+		return grid
+
+	def render(self, key) -> pygame.Surface:
+		layout = _layout()
+		area = layout["grid"]
+		grid = pygame.Surface(area.size)
+		try:
+			grid = grid.convert()		# display pixel format: faster blits
+		except pygame.error:
+			pass						# no display mode set (offscreen drawing)
+		grid.fill(WHITE)
+		for rect, inputs in zip(layout["pads"], key):
+			_draw_pad(grid, rect.move(-area.x, -area.y), inputs)
+		self._grids[key] = grid
+		self._grids.move_to_end(key)
+		while len(self._grids) > self.max_items:
+			self._grids.popitem(last=False)
+		return grid
+
+	def get_or_render(self, key) -> pygame.Surface:
+		grid = self.get(key)
+		if grid is None:
+			self.misses += 1
+			grid = self.render(key)
+		return grid
+
+	def prefetch(self, squares) -> bool:
+		"""Render the grid of these squares if it is not cached yet; True if some work was done."""
+		key = self.key(squares)
+		if key in self._grids:
+			return False
+		self.render(key)
+		return True
+
+
+class Dashboard:
+	"""
+	Same drawing as draw_dashboard(), by parts: each pad, the volume/tempo/sound line, the
+	song line and the overlay. draw() repaints only the parts whose inputs changed since the
+	last call and returns their rectangles, to be pushed with pygame.display.update(rects).
+	The pads come from pre-rendered grids (see PadGridCache), so a song change is one blit.
+	"""
+
+	def __init__(self, grids: PadGridCache | None = None):
+		self.state = None		# inputs of the parts on screen (None: nothing drawn yet)
+		self.pixels = 0			# pixels repainted by the last draw()
+		self.grids = PadGridCache() if grids is None else grids
+
+	def invalidate(self):
+		"""Repaint everything at the next draw() (e.g. after something else drew on the screen)."""
+		self.state = None
+
+	def draw(self, screen, squares, volume_percent, tempo_bpm, sound, prev_song, current_song, next_song, overlay=None):
+		state = _dashboard_state(squares, volume_percent, tempo_bpm, sound, prev_song, current_song, next_song, overlay)
+		layout = _layout()
+		if self.state is None:
+			rects = [screen.get_rect()]
+		else:
+			rects = [_part_rect(layout, part) for part in state if state[part] != self.state[part]]
+		pads_changed = [rect for rect in rects if rect.colliderect(layout["grid"])]
+		grid = self.grids.get_or_render(self.grids.key(squares)) if pads_changed else None
+		if len(pads_changed) > 1:
+			# several pads (e.g. a new song): one blit of the whole grid
+			rects = [rect for rect in rects if not rect.colliderect(layout["grid"])] + [layout["grid"]]
+			if state["overlay"] or (self.state is not None and self.state["overlay"]):
+				rects.append(layout["overlay"])		# the overlay starts above the grid
+		for rect in rects:
+			_paint(screen, rect, state, layout, grid)
+		self.state = state
+		self.pixels = sum(rect.w * rect.h for rect in rects)
+		return rects
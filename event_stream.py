@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from array import array
+from pathlib import Path
+
+import mido
+
+# Opcodes of a compiled event stream (one byte per event)
+OP_NOTE_ON = 1
+OP_NOTE_OFF = 2
+OP_CONTROL_CHANGE = 3
+
+
+class EventStream:
+	"""
+	A MIDI file compiled to parallel arrays, one entry per playable event.
+
+	  ticks    absolute time in ticks
+	  times    absolute time in seconds at speed 1.0
+	  ops      OP_* opcode
+	  channels MIDI channel (0-based)
+	  data1    note or controller number
+	  data2    velocity or controller value
+
+	Meta events and program changes are dropped at compile time, and note_on
+	with velocity 0 is turned into OP_NOTE_OFF, so the playback loop only has
+	to dispatch on integer opcodes.
+	"""
+
+	__slots__ = ("ticks", "times", "ops", "channels", "data1", "data2", "length", "ticks_per_beat")
+
+	def __init__(self, ticks_per_beat: int = 480):
+		self.ticks = array("L")
+		self.times = array("d")
+		self.ops = array("B")
+		self.channels = array("B")
+		self.data1 = array("B")
+		self.data2 = array("B")
+		self.length = 0.0			# loop length in seconds at speed 1.0
+		self.ticks_per_beat = ticks_per_beat
+
+	def __len__(self):
+		return len(self.ops)
+
+	def append(self, tick: int, at: float, op: int, channel: int, data1: int, data2: int):
+		self.ticks.append(tick)
+		self.times.append(at)
+		self.ops.append(op)
+		self.channels.append(channel)
+		self.data1.append(data1)
+		self.data2.append(data2)
+
+
+def compile_midi(source: str | Path | mido.MidiFile) -> EventStream:
+	"""Compile a MIDI file (path or parsed mido.MidiFile) into an EventStream."""
+	mid = source if isinstance(source, mido.MidiFile) else mido.MidiFile(source)
+	stream = EventStream(mid.ticks_per_beat)
+
+	tempo = 500000			# MIDI default: 120 BPM
+	tick = 0
+	now = 0.0
+	for msg in mido.merge_tracks(mid.tracks):
+		if msg.time:
+			tick += msg.time
+			now += mido.tick2second(msg.time, mid.ticks_per_beat, tempo)
+
+		if msg.is_meta:
+			if msg.type == "set_tempo":
+				tempo = msg.tempo
+			continue
+
+		if msg.type == "note_on":
+			op = OP_NOTE_ON if msg.velocity > 0 else OP_NOTE_OFF
+			stream.append(tick, now, op, msg.channel, msg.note, msg.velocity)
+		elif msg.type == "note_off":
+			stream.append(tick, now, OP_NOTE_OFF, msg.channel, msg.note, msg.velocity)
+		elif msg.type == "control_change":
+			stream.append(tick, now, OP_CONTROL_CHANGE, msg.channel, msg.control, msg.value)
+		# program changes are filtered out: the sound is chosen by the player
+
+	stream.length = now
+	return stream
@@ -0,0 +1,122 @@
+# fake_drive.py
+# Stand-in for the Google Drive v3 service that serves a local folder, to try update.sync_public_drive_folder offline:
+#
+#   service = fake_drive.FakeDriveService("./my_playlist")
+#   update.sync_public_drive_folder(service.root_id, dest_root="./synced", service=service)
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+
+import update
+
+
+class _Request:
+	def __init__(self, run):
+		self._run = run
+
+	def execute(self, num_retries=0):
+		return self._run()
+
+
+class _Files:
+	def __init__(self, drive):
+		self.drive = drive
+
+	def get(self, fileId, fields=None, supportsAllDrives=None):
+		return _Request(lambda: self.drive._meta(self.drive._path(fileId)))
+
+	def list(self, q, fields=None, pageSize=1000, pageToken=None, includeItemsFromAllDrives=None, supportsAllDrives=None):
+		parent_id = q.split("'")[1]
+		return _Request(lambda: self.drive._list(parent_id, pageSize, int(pageToken or 0)))
+
+	def get_media(self, fileId, supportsAllDrives=None):
+		self.drive.media_calls += 1
+		return _MediaRequest(self.drive, fileId)
+
+
+class _Response(dict):
+	# headers of an httplib2.Response, with its status
+	def __init__(self, status, headers):
+		super().__init__(headers)
+		self.status = status
+
+
+class _Http:
+	"""Serves the Range requests of googleapiclient's MediaIoBaseDownload from the folder."""
+
+	def __init__(self, drive):
+		self.drive = drive
+
+	def request(self, uri, method="GET", body=None, headers=None, **kwargs):
+		data = self.drive._path(uri.rsplit("/", 1)[1].split("?")[0]).read_bytes()
+		match = re.fullmatch(r"bytes=(\d+)-(\d+)", (headers or {}).get("range", ""))
+		if match is None:
+			self.drive.bytes_served += len(data)
+			return _Response(200, {"content-length": str(len(data))}), data
+		first, last = int(match.group(1)), min(int(match.group(2)), len(data) - 1)
+		if first >= len(data):
+			return _Response(416, {"content-range": f"bytes */{len(data)}"}), b""
+		chunk = data[first:last + 1]
+		self.drive.bytes_served += len(chunk)
+		return _Response(206, {"content-range": f"bytes {first}-{last}/{len(data)}"}), chunk
+
+
+class _MediaRequest:
+	# the attributes of a googleapiclient HttpRequest that MediaIoBaseDownload uses
+	def __init__(self, drive, file_id):
+		self.uri = f"https://fake.drive/files/{file_id}?alt=media"
+		self.headers = {}
+		self.http = _Http(drive)
+
+
+class FakeDriveService:
+	"""
+	Same interface as the googleapiclient Drive v3 service (the part update.py uses), serving
+	the files under `root` as a public Drive folder. The root folder id is `root_id`.
+	Media requests are served over a fake HTTP object, so downloads go through
+	googleapiclient's MediaIoBaseDownload like with the real service.
+	Counts the requests made (`list_calls`, `media_calls`) and the bytes served.
+	"""
+
+	def __init__(self, root: str | os.PathLike):
+		self.root = Path(root)
+		self.root_id = self._id(self.root)
+		self.list_calls = 0
+		self.media_calls = 0
+		self.bytes_served = 0
+
+	def files(self):
+		return _Files(self)
+
+	def _id(self, path: Path) -> str:
+		return "fake" + hashlib.sha1(str(path.relative_to(self.root.parent)).encode()).hexdigest()[:24]
+
+	def _path(self, file_id: str) -> Path:
+		for path in [self.root, *self.root.rglob("*")]:
+			if self._id(path) == file_id:
+				return path
+		raise FileNotFoundError(file_id)
+
+	def _meta(self, path: Path) -> dict:
+		if path.is_dir():
+			return {"id": self._id(path), "name": path.name, "mimeType": update.FOLDER_MIME}
+		data = path.read_bytes()
+		return {
+			"id": self._id(path),
+			"name": path.name,
+			"mimeType": "application/octet-stream",
+			"md5Checksum": hashlib.md5(data).hexdigest(),
+			"modifiedTime": time.strftime("%Y-%m-%dT%H:%M:%S.000Z", time.gmtime(path.stat().st_mtime)),
+			"size": str(len(data)),		# Drive returns sizes as strings
+		}
+
+	def _list(self, parent_id: str, page_size: int, start: int) -> dict:
+		self.list_calls += 1
+		children = sorted(self._path(parent_id).iterdir())
+		page = children[start:start + page_size]
+		resp = {"files": [self._meta(path) for path in page]}
+		if start + page_size < len(children):
+			resp["nextPageToken"] = str(start + page_size)
+		return resp
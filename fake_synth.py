@@ -0,0 +1,69 @@
+# fake_synth.py
+# Stand-in for fluidsynth.Synth that makes no sound and records what it is asked to play.
+import time
+
+import numpy
+
+
+class RecordingSynth:
+	"""
+	Same interface as fluidsynth.Synth (the part autobass uses). Every note and
+	controller call is appended to `events` as (time.monotonic(), kind, channel, data1, data2).
+	`on_event`, when set, is called with each recorded tuple (e.g. to time the first note).
+	keep_events=False only calls on_event, so nothing accumulates during long runs.
+	"""
+
+	def __init__(self, sample_rate: int = 44100, keep_events: bool = True):
+		self.events = []
+		self.keep_events = keep_events
+		self.on_event = None
+		self.settings = {"synth.sample-rate": float(sample_rate), "synth.gain": 0.2}
+		self.programs = {}
+
+	def _record(self, kind, channel, data1=0, data2=0):
+		event = (time.monotonic(), kind, channel, data1, data2)
+		if self.keep_events:
+			self.events.append(event)
+		if self.on_event is not None:
+			self.on_event(event)
+
+	def clear(self):
+		self.events = []
+
+	# --- fluidsynth.Synth interface ---
+	def start(self, driver=None, device=None, midi_driver=None, midi_router=None):
+		return 0
+
+	def delete(self):
+		pass
+
+	def sfload(self, filename, update_midi_preset=0):
+		return 1
+
+	def setting(self, opt, val):
+		self.settings[opt] = val
+
+	def get_setting(self, opt):
+		return self.settings.get(opt)
+
+	def program_select(self, chan, sfid, bank, preset):
+		self.programs[chan] = (sfid, bank, preset)
+		return 0
+
+	def noteon(self, chan, key, vel):
+		self._record("note_on", chan, key, vel)
+
+	def noteoff(self, chan, key):
+		self._record("note_off", chan, key)
+
+	def cc(self, chan, ctrl, val):
+		self._record("control_change", chan, ctrl, val)
+
+	def all_notes_off(self, chan):
+		pass
+
+	def all_sounds_off(self, chan):
+		pass
+
+	def get_samples(self, len=1024):
+		return numpy.zeros(2 * len, numpy.int16)
@@ -1,103 +1,604 @@
+import math
+import queue
 import threading
 import time
+import wave
+from array import array
+from bisect import bisect_right
+from collections import deque
+from dataclasses import dataclass
+
 import fluidsynth
-import pretty_midi
-import mido
+import numpy
+
+from audio_profile import PROFILE_PATH, load_profile
+from event_stream import OP_NOTE_ON, OP_NOTE_OFF, OP_CONTROL_CHANGE
+from pad_cache import PadCache
+from timing_stats import HandoverRecorder, TimingRecorder
+
+# launch quantization: when a pad is hit while another one plays, the new pad
+# takes over right away, at the next beat or at the next bar of the playing pad
+QUANTIZE_IMMEDIATE = "immediate"
+QUANTIZE_BEAT = "beat"
+QUANTIZE_BAR = "bar"
+QUANTIZE_MODES = (QUANTIZE_IMMEDIATE, QUANTIZE_BEAT, QUANTIZE_BAR)
+
+MIN_SPEED, MAX_SPEED = 0.1, 4.0		# range of the tempo ratio
+
+class SongClock:
+	"""
+	Maps a song position (seconds of MIDI time at speed 1.0) to absolute
+	deadlines on a time base (time.monotonic() unless another one is given).
+
+	The clock keeps a single anchor (wall time, song position, speed). A speed
+	change re-anchors at the current position, so the part already played is
+	never rescaled and errors cannot accumulate from one event to the next.
+
+	A ramp makes the speed change linearly with the song position, from the
+	anchor to ramp_end, then stay at the target speed. Deadlines and positions
+	are computed in closed form (the time to go from p0 to p at speed
+	s(p) = s0 + k (p - p0) is ln(s(p) / s0) / k), so the loop phase is kept.
+	A hold keeps a constant speed from the anchor to its end instead (see align()).
+	"""
+
+	def __init__(self, speed: float = 1.0, now=time.monotonic):
+		self.now = now
+		# (wall time, song position, speed, ramp end position or None, speed at ramp end, hold)
+		self._anchor = (now(), 0.0, speed, None, speed, False)
+
+	def start(self, position: float = 0.0, at: float | None = None):
+		now = self.now() if at is None else at
+		speed = self.speed(now)
+		self._anchor = (now, position, speed, None, speed, False)
+
+	def set_speed(self, speed: float, at: float | None = None):
+		now = self.now() if at is None else at
+		self._anchor = (now, self.position(now), speed, None, speed, False)
+
+	def ramp(self, speed: float, length: float, at: float | None = None):
+		"""Go linearly from the current speed to `speed` over `length` seconds of song position."""
+		now = self.now() if at is None else at
+		position = self.position(now)
+		if length <= 0.0:
+			self._anchor = (now, position, speed, None, speed, False)
+		else:
+			self._anchor = (now, position, self.speed(now), position + length, speed, False)
+
+	def align(self, shift: float, speed: float, length: float, at: float | None = None):
+		"""
+		Move the song position back by `shift` seconds (forward if negative) over the next
+		`length` seconds of song position at `speed`, then go on at `speed`: the speed is held
+		slightly lower (or higher) until the phase is caught up, without skipping any event.
+		"""
+		now = self.now() if at is None else at
+		position = self.position(now)
+		shift = max(-0.5 * length, min(shift, 0.5 * length))
+		if length <= 0.0 or shift == 0.0:
+			self._anchor = (now, position, speed, None, speed, False)
+		else:
+			self._anchor = (now, position, speed * (length - shift) / length, position + length - shift, speed, True)
+
+	def speed(self, now: float | None = None) -> float:
+		wall, pos, s0, end, s1, hold = self._anchor
+		if end is None:
+			return s0
+		p = self.position(now)
+		if p >= end:
+			return s1
+		if hold:
+			return s0
+		return s0 + (s1 - s0) * (p - pos) / (end - pos)
+
+	def position(self, now: float | None = None) -> float:
+		wall, pos, s0, end, s1, hold = self._anchor
+		dt = (self.now() if now is None else now) - wall
+		if end is None or dt <= 0.0:
+			return pos + dt * s0
+		k = 0.0 if hold else (s1 - s0) / (end - pos)
+		ramp_time = math.log(s1 / s0) / k if k else (end - pos) / s0
+		if dt >= ramp_time:
+			return end + (dt - ramp_time) * s1
+		return pos + (s0 * (math.exp(k * dt) - 1.0) / k if k else dt * s0)
+
+	def deadline(self, position: float) -> float:
+		wall, pos, s0, end, s1, hold = self._anchor
+		if end is None or position <= pos:
+			return wall + (position - pos) / s0
+		k = 0.0 if hold else (s1 - s0) / (end - pos)
+		p = min(position, end)
+		sp = s0 + k * (p - pos)
+		t = wall + (math.log(sp / s0) / k if k else (p - pos) / s0)
+		if position > end:
+			t += (position - end) / s1
+		return t
+
+
+class DirectOutput:
+	"""
+	Playback output calling the synth directly: the sequencer thread dispatches
+	each event when its deadline is reached.
+	"""
+	lookahead = 0.0
+	can_cancel = False
+
+	def __init__(self, fs):
+		self.fs = fs
+		self.now = time.monotonic
+		self._cc = getattr(fs, "cc", None)
+
+	def noteon(self, at: float, channel: int, key: int, velocity: int):
+		self.fs.noteon(channel, key, velocity)
+
+	def noteoff(self, at: float, channel: int, key: int):
+		self.fs.noteoff(channel, key)
+
+	def cc(self, at: float, channel: int, control: int, value: int):
+		if self._cc is not None:
+			self._cc(channel, control, value)
+
+	def cancel(self):
+		pass
+
+	def close(self):
+		pass
+
+
+@dataclass
+class RenderResult:
+	samples: numpy.ndarray		# int16, shape (frames, 2)
+	sample_rate: int
+	elapsed: float				# wall-clock seconds spent rendering
+
+	@property
+	def seconds(self) -> float:
+		return len(self.samples) / self.sample_rate
+
+	@property
+	def realtime_factor(self) -> float:
+		"""Seconds of audio rendered per second of CPU time (>1 means faster than realtime)."""
+		return self.seconds / self.elapsed if self.elapsed > 0 else float("inf")
+
+	def write_wav(self, wav_path: str):
+		with wave.open(wav_path, "wb") as w:
+			w.setnchannels(2)
+			w.setsampwidth(2)
+			w.setframerate(self.sample_rate)
+			w.writeframes(self.samples.astype("<i2").tobytes())
+
 
 class LiveFsPlayer:
 	DRUM_CHANNEL = 9  # MIDI channel 10 in human terms; 0-based index
-
-	def __init__(self, sf2_path: str, audio_driver: str = "default", output_device: str = "hw:0"):
-		self.fs = fluidsynth.Synth()
-
-		# Start FluidSynth with the specified output device
-		self.fs.start(driver=audio_driver, device=output_device)
+	COMMAND_QUEUE_SIZE = 256
+	MERGEABLE_COMMANDS = ("set_speed", "ramp_speed", "set_gain")	# only the latest one matters
+
+	def __init__(
+		self,
+		sf2_path: str,
+		audio_driver: str | None = "default",
+		output_device: str = "hw:0",
+		backend: str = "direct",
+		lookahead: float = 0.3,
+		synth=None,
+		lazy_samples: bool = False,
+		audio_profile: str | None = PROFILE_PATH,
+	):
+		"""
+		audio_driver: None for offline mode (no audio device, see render())
+		synth: object with the fluidsynth.Synth interface to use instead of a new
+		       FluidSynth instance (e.g. fake_synth.RecordingSynth for benchmarks)
+		lazy_samples: load the samples of a preset only when it is selected on a channel
+		       (fluidsynth's synth.dynamic-sample-loading), instead of the whole soundfont at
+		       startup; see also sf2_trim.py to strip unused presets from the soundfont
+		audio_profile: JSON written by audio_profile.py; its buffer settings (audio.period-size,
+		       audio.periods) are applied before the audio driver starts. Missing file: defaults
+		backend:
+		  "direct"    the sequencer thread calls the synth when each event is due
+		  "sequencer" events are scheduled `lookahead` seconds ahead into FluidSynth's
+		              own sequencer, so their timing follows the audio clock
+		"""
+		if synth is None:
+			settings = {"synth.dynamic-sample-loading": 1} if lazy_samples else {}
+			if audio_driver is not None and audio_profile:
+				settings.update(load_profile(audio_profile))
+			synth = fluidsynth.Synth(**settings)
+		self.fs = synth
+
+		# Start FluidSynth with the specified output device (offline: samples are pulled by render())
+		self.offline = audio_driver is None
+		if not self.offline:
+			self.fs.start(driver=audio_driver, device=output_device)
 
 		self.sfid = self.fs.sfload(sf2_path)
-		self.set_all_instruments(bank=0, preset=0, skip_drums=True)
 
 		for ch in range(16):
 			if ch != 9:
 				self.fs.program_select(ch, self.sfid, 0, 0)
 
+		if backend == "sequencer":
+			if self.offline:
+				# the sequencer clock only advances while an audio driver renders
+				raise ValueError("offline mode (audio_driver=None) only supports backend='direct'")
+			from fs_sequencer import SequencerOutput
+			self._output = SequencerOutput(self.fs, lookahead)
+		elif backend == "direct":
+			self._output = DirectOutput(self.fs)
+		else:
+			raise ValueError("backend must be 'direct' or 'sequencer'")
+
 		self.speed = 1.0
-		self._events = []
-		self._stop = threading.Event()
-		self._thread = None
-		self._loop = True
+		self.pad_cache = PadCache()
+		self.quantize = QUANTIZE_IMMEDIATE
+		self._clock = SongClock(self.speed, now=self._output.now)
+		# with events handed over ahead of time, only the hand-over can be timed here
+		self.timing = HandoverRecorder() if self._output.lookahead else TimingRecorder()
+		self._active = bytearray(16 * 128)	# sounding notes, indexed by channel * 128 + note
+		self._off_at = array("d", bytes(8 * 16 * 128))	# deadline of the last note-off handed over, per note
+
+		# One sequencer thread lives as long as the player. Every other thread talks to it
+		# through _commands (deque append/popleft are atomic, no lock is taken) and sets
+		# _wake, which interrupts the wait for the next event deadline.
+		self._commands = deque()
+		self._wake = threading.Event()
+		self._thread = threading.Thread(target=self._run, daemon=True)
+		self._thread.start()
+
+	def _send(self, *command):
+		"""
+		Queue a command for the sequencer thread. If the queue is full (the thread is
+		stalled, e.g. loading samples for program_select), a tempo or volume change
+		replaces its pending one; other commands raise queue.Full.
+		"""
+		commands = self._commands
+		if len(commands) >= self.COMMAND_QUEUE_SIZE:
+			if command[0] not in self.MERGEABLE_COMMANDS:
+				raise queue.Full("sequencer command queue is full")
+			for pending in list(commands):
+				if pending[0] == command[0]:
+					try:
+						commands.remove(pending)
+					except ValueError:
+						pass		# taken by the sequencer thread meanwhile
+					break
+		commands.append(command)
+		self._wake.set()
 
 	def set_speed(self, speed: float):
-		self.speed = max(0.1, min(speed, 4.0))
+		"""Change the tempo ratio now: the wait for the next event is rescaled right away."""
+		self.speed = max(MIN_SPEED, min(speed, MAX_SPEED))
+		self._send("set_speed", self.speed)
 
-	def play(self, midi_path: str, loop: bool = True) -> float:
+	def ramp_speed(self, speed: float, beats: float):
 		"""
-		Preloads MIDI, starts playback, returns reference BPM
+		Change the tempo ratio linearly over `beats` beats of the playing pad
+		(ritardando / accelerando, or smoothing of knob jitter). beats <= 0 is set_speed().
 		"""
+		self.speed = max(MIN_SPEED, min(speed, MAX_SPEED))
+		self._send("ramp_speed", self.speed, float(beats))
 
-		# 1) compute reference BPM once
-		pm = pretty_midi.PrettyMIDI(midi_path)
-		reference_bpm = pm.estimate_tempo()
-
-		# 2) preload MIDI events ONCE (gapless looping key)
-		self._events = self._preload_events(midi_path)
+	def align_beat(self, beat_time: float, speed: float):
+		"""
+		Tap tempo: change the tempo ratio and move the playing pad onto the tapped grid, so
+		that its beat nearest to beat_time (a time.monotonic() of the grid, e.g. the last tap)
+		falls on it. The phase is caught up over the next beat, no event is skipped.
+		"""
+		self.speed = max(MIN_SPEED, min(speed, MAX_SPEED))
+		at = beat_time - time.monotonic() + self._output.now()		# on the output's time base
+		self._send("align", at, self.speed)
 
-		self.stop()
-		self._loop = loop
-		self._stop.clear()
-		self._thread = threading.Thread(target=self._run, daemon=True)
-		self._thread.start()
+	def play(self, midi_path: str, loop: bool = True, quantize: str | None = None, program: tuple[int, int] | None = None) -> float:
+		"""
+		Starts playback of a MIDI file, returns reference BPM
+		The file is taken from pad_cache (prepared now on a cache miss).
+
+		quantize: one of QUANTIZE_MODES (default: self.quantize). If a pad is already
+		playing, the new pad is queued and takes over at that boundary of the playing
+		pad, on the same timeline; notes still sounding get their note-off at the switch.
+		program: (bank, preset) selected on all channels but drums when the new pad takes
+		over, so the playing pad keeps its sound until the switch.
+		"""
+		quantize = quantize or self.quantize
+		if quantize not in QUANTIZE_MODES:
+			raise ValueError(f"quantize must be one of {QUANTIZE_MODES}")
 
-		return reference_bpm
+		# compiled MIDI events and reference BPM are computed ONCE per file (gapless looping key)
+		pad = self.pad_cache.get_or_prepare(midi_path)
+		self._send("play", pad, loop, quantize, program)
+		return pad.reference_bpm
 
 	def stop(self):
-		if self._thread and self._thread.is_alive():
-			self._stop.set()
-			self._thread.join(timeout=1.0)
-		self._thread = None
-
-	def _preload_events(self, midi_path):
-		mid = mido.MidiFile(midi_path)
-		res = []
-		# filter out all the PC messages
-		for msg in mid:
-			if msg.type != "program_change":
-				tp = (msg.time, msg)
-				res.append (tp)
-		return res
-		#return [(msg.time, msg) for msg in mid]
+		self._send("stop")
 
-	def _run(self):
-		while not self._stop.is_set():
-			for delta, msg in self._events:
-				if self._stop.is_set():
-					return
+	def preload(self, midi_paths):
+		"""Prepare these pads in the background (see PadCache.preload)."""
+		self.pad_cache.preload(midi_paths)
 
-				if delta > 0:
-					time.sleep(delta / self.speed)
+	def close(self):
+		"""Stop playback and end the sequencer thread."""
+		if self._thread.is_alive():
+			self._send("quit")
+			self._thread.join(timeout=1.0)
+		self._output.close()
 
-				if getattr(msg, "is_meta", False):
-					continue
+	def get_timing_report(self) -> dict:
+		"""
+		Lateness of dispatched events against their scheduled deadline, in seconds
+		(see TimingRecorder.snapshot()); with the "sequencer" backend, how far ahead of
+		their deadline they were handed over (see HandoverRecorder.snapshot()).
+		"""
+		return self.timing.snapshot()
+
+	def render(
+		self,
+		midi_path: str,
+		speed: float | None = None,
+		preset: int | None = None,
+		gain: float | None = None,
+		loops: int = 1,
+		tail: float = 1.0,
+		block_size: int = 64,
+	) -> "RenderResult":
+		"""
+		Offline mode only: render a pad as fast as the CPU allows.
 
-				ch = getattr(msg, "channel", 0)
+		Samples are pulled from the synth with get_samples() in blocks of block_size
+		frames; each event is applied at the start of the block holding its time.
+		`tail` seconds are rendered after the last loop so releases ring out.
+		speed / preset / gain default to the current player settings.
+		"""
+		if not self.offline:
+			raise RuntimeError("render() needs a player created with audio_driver=None")
+
+		pad = self.pad_cache.get_or_prepare(midi_path)
+		stream = pad.stream
+		speed = self.speed if speed is None else max(MIN_SPEED, min(speed, MAX_SPEED))
+		if preset is not None:
+			for ch in range(16):
+				if ch != self.DRUM_CHANNEL:
+					self.fs.program_select(ch, self.sfid, 0, int(preset))
+		if gain is not None:
+			self.fs.setting("synth.gain", max(0.0, min(float(gain), 1.0)))
+
+		# start from silence: nothing left ringing from a previous render
+		for ch in range(16):
+			self.fs.all_sounds_off(ch)
+
+		sample_rate = int(self.fs.get_setting("synth.sample-rate") or 44100)
+		frames_per_second = sample_rate / speed
+		fs = self.fs
+		blocks = []
+		rendered = 0
+		active = bytearray(16 * 128)
+
+		started = time.perf_counter()
+		for n in range(loops):
+			offset = n * stream.length
+			for i in range(len(stream)):
+				frame = int(round((offset + stream.times[i]) * frames_per_second))
+				while rendered + block_size <= frame:
+					blocks.append(fs.get_samples(block_size))
+					rendered += block_size
+
+				op, ch, d1 = stream.ops[i], stream.channels[i], stream.data1[i]
+				if op == OP_NOTE_ON:
+					fs.noteon(ch, d1, stream.data2[i])
+					active[(ch << 7) | d1] = 1
+				elif op == OP_NOTE_OFF:
+					fs.noteoff(ch, d1)
+					active[(ch << 7) | d1] = 0
+				elif op == OP_CONTROL_CHANGE and hasattr(fs, "cc"):
+					fs.cc(ch, d1, stream.data2[i])
+
+		end = int(round(loops * stream.length * frames_per_second))
+		while rendered < end:
+			blocks.append(fs.get_samples(block_size))
+			rendered += block_size
+		for idx, on in enumerate(active):
+			if on:
+				fs.noteoff(idx >> 7, idx & 127)
+		end += int(tail * sample_rate)
+		while rendered < end:
+			blocks.append(fs.get_samples(block_size))
+			rendered += block_size
+		elapsed = time.perf_counter() - started
+
+		samples = numpy.concatenate(blocks).reshape(-1, 2) if blocks else numpy.zeros((0, 2), numpy.int16)
+		return RenderResult(samples=samples, sample_rate=sample_rate, elapsed=elapsed)
+
+	def _switch_position(self, tempo_map, loop_start: float, quantize: str) -> float:
+		"""Song position at which a pending pad takes over the playing one."""
+		position = self._clock.position()
+		if tempo_map is None or quantize == QUANTIZE_IMMEDIATE:
+			return position
+		bar = quantize == QUANTIZE_BAR
+		return loop_start + tempo_map.next_boundary(position - loop_start, bar=bar)
+
+	def _cancel(self, at: float):
+		"""
+		Drop the events handed over ahead of time (see SequencerOutput.cancel()). A note
+		whose note-off was dropped (due after `at`) is sounding again: it is marked active,
+		so that it is released or gets its note-off handed over again.
+		"""
+		self._output.cancel()
+		active, off_at = self._active, self._off_at
+		for idx, t in enumerate(off_at):
+			if t > at:
+				active[idx] = 1
+				off_at[idx] = 0.0
+
+	def _release_notes(self, at: float):
+		"""Send a note-off (due at `at`) to every note still sounding."""
+		active = self._active
+		noteoff = self._output.noteoff
+		for idx, on in enumerate(active):
+			if on:
+				noteoff(at, idx >> 7, idx & 127)
+				active[idx] = 0
 
-				if msg.type == "note_on":
-					if msg.velocity == 0:
-						self.fs.noteoff(ch, msg.note)
-					else:
-						self.fs.noteon(ch, msg.note, msg.velocity)
+	def _run(self):
+		output = self._output
+		noteon, noteoff, cc = output.noteon, output.noteoff, output.cc
+		clock = self._clock
+		deadline_of = clock.deadline
+		now = output.now
+		# events are handed over once they are due within `ahead` seconds; the thread
+		# then sleeps until half of the window is left, so it tops up in batches
+		ahead = output.lookahead
+		refill = ahead * 0.5
+		commands, wake = self._commands, self._wake
+		active, off_at = self._active, self._off_at
+		record = self.timing.record
+		prev_deadline = prev_actual = None		# last dispatched event, to measure loop-boundary gaps
+		wrapped = False
+
+		# current pad (none yet)
+		times, ops, channels, data1, data2 = (), (), (), (), ()
+		count, length, loop = 0, 0.0, False
+		tempo_map = None
+		i = 0
+		# all deadlines come from one song-position clock: the n-th pass of the loop
+		# starts exactly n * loop length after the first one, whatever happened before
+		loop_start = 0.0
+		pending = None				# (PreparedPad, loop, quantize, program) waiting to take over
+		switch_at = None			# song position where the pending pad takes over
+
+		try:
+			while True:
+				# commands are applied between events, never in the middle of a dispatch
+				if wake.is_set():
+					wake.clear()
+					reschedule = False
+					while commands:
+						command = commands.popleft()
+						name = command[0]
+
+						if name == "play":
+							pending = command[1:]
+							if count == 0:
+								switch_at = clock.position()
+							else:
+								switch_at = self._switch_position(tempo_map, loop_start, pending[2])
+							reschedule = True
+
+						elif name == "stop":
+							self._cancel(now())
+							self._release_notes(now())
+							times, ops, channels, data1, data2 = (), (), (), (), ()
+							count, length, loop = 0, 0.0, False
+							i = 0
+							pending = switch_at = None
+
+						elif name == "set_speed":
+							clock.set_speed(command[1])
+							reschedule = True
+
+						elif name == "ramp_speed":
+							_, speed, beats = command
+							position = clock.position()
+							if tempo_map is not None:
+								beat = tempo_map.beat_length(position - loop_start)
+							else:
+								beat = 0.5		# nothing playing: 120 BPM beats
+							clock.ramp(speed, beats * beat)
+							reschedule = True
+
+						elif name == "align":
+							_, at, speed = command
+							if count:
+								position = clock.position(at) - loop_start
+								clock.align(tempo_map.beat_phase(position), speed, tempo_map.beat_length(position))
+							else:
+								clock.set_speed(speed)
+							reschedule = True
+
+						elif name == "set_program":
+							_, chans, bank, preset = command
+							for ch in chans:
+								self.fs.program_select(ch, self.sfid, bank, preset)
+
+						elif name == "set_gain":
+							self.fs.setting("synth.gain", command[1])
+
+						elif name == "quit":
+							return
+
+					if reschedule and output.can_cancel and count:
+						# drop the events handed over ahead of time and hand them over again,
+						# with the new tempo or up to the new switch position
+						self._cancel(now())
+						position = clock.position()
+						while loop_start > position and length > 0.0:
+							loop_start -= length
+						i = bisect_right(times, position - loop_start)
+
+				# next thing to do: dispatch event i, end the loop pass, or switch pads
+				if i < count:
+					target = loop_start + times[i]
+				elif loop and length > 0.0:
+					target = loop_start + length
+				else:
+					target = None		# idle, or the pad has played to its end
+				switching = switch_at is not None and (target is None or switch_at <= target)
+				if switching:
+					target = switch_at
+				elif target is None:
+					# nothing to play: sleep until the next command
+					wake.wait()
+					continue
 
-				elif msg.type == "note_off":
-					self.fs.noteoff(ch, msg.note)
+				# a pad switch changes the engine state, so it happens when due, not ahead of time
+				lead = 0.0 if switching else ahead
+				deadline = deadline_of(target)
+				wait = deadline - now()
+				if wait > lead:
+					wake.wait(wait - (0.0 if switching else refill))
+					continue
 
-				elif msg.type == "program_change":
-					self.fs.program_select(ch, self.sfid, 0, msg.program)
+				if switching:
+					self._release_notes(deadline)
+					pad, loop, _, program = pending
+					if program is not None:
+						for ch in range(16):
+							if ch != self.DRUM_CHANNEL:
+								self.fs.program_select(ch, self.sfid, *program)
+					stream, tempo_map = pad.stream, pad.tempo_map
+					times, ops, channels = stream.times, stream.ops, stream.channels
+					data1, data2 = stream.data1, stream.data2
+					count, length = len(stream), stream.length
+					loop_start, i = target, 0
+					pending = switch_at = None
+					wrapped = False
+					continue
 
-				elif msg.type == "control_change":
-					if hasattr(self.fs, "cc"):
-						self.fs.cc(ch, msg.control, msg.value)
+				if i >= count:
+					# next pass of the loop
+					loop_start += length
+					i = 0
+					wrapped = True
+					continue
 
-			if not self._loop:
-				return
+				# late events are dispatched right away (caught up), the clock is not shifted
+				actual = now()
+				if wrapped:
+					if prev_actual is not None:
+						self.timing.record_loop_gap((actual - prev_actual) - (deadline - prev_deadline))
+					wrapped = False
+
+				op = ops[i]
+				if op == OP_NOTE_ON:
+					noteon(deadline, channels[i], data1[i], data2[i])
+					active[(channels[i] << 7) | data1[i]] = 1
+				elif op == OP_NOTE_OFF:
+					noteoff(deadline, channels[i], data1[i])
+					active[(channels[i] << 7) | data1[i]] = 0
+					off_at[(channels[i] << 7) | data1[i]] = deadline
+				elif op == OP_CONTROL_CHANGE:
+					cc(deadline, channels[i], data1[i], data2[i])
+				i += 1
+				prev_deadline, prev_actual = deadline, actual
+				record(deadline, actual, now() - actual)
+		finally:
+			self._cancel(now())
+			self._release_notes(now())
 
 	def set_instrument(self, channel: int, bank: int, preset: int):
 		"""
@@ -117,7 +618,7 @@ class LiveFsPlayer:
 		if bank < 0:
 			raise ValueError("bank must be >= 0")
 
-		self.fs.program_select(channel, self.sfid, bank, preset)  # [1](https://pypi.org/project/pyfluidsynth/)[3](https://www.fluidsynth.org/api/group__midi__messages.html)
+		self._send("set_program", (channel,), bank, preset)  # [1](https://pypi.org/project/pyfluidsynth/)[3](https://www.fluidsynth.org/api/group__midi__messages.html)
 
 	def set_all_instruments(self, bank: int, preset: int, skip_drums: bool = True):
 		"""
@@ -129,10 +630,8 @@ class LiveFsPlayer:
 		bank = int(bank)
 		preset = int(preset)
 
-		for ch in range(16):
-			if skip_drums and ch == self.DRUM_CHANNEL:
-				continue
-			self.fs.program_select(ch, self.sfid, bank, preset)  # [1](https://pypi.org/project/pyfluidsynth/)[3](https://www.fluidsynth.org/api/group__midi__messages.html)
+		chans = tuple(ch for ch in range(16) if not (skip_drums and ch == self.DRUM_CHANNEL))
+		self._send("set_program", chans, bank, preset)  # [1](https://pypi.org/project/pyfluidsynth/)[3](https://www.fluidsynth.org/api/group__midi__messages.html)
 
 	def set_master_volume(self, volume: float):
 		"""
@@ -145,4 +644,4 @@ class LiveFsPlayer:
 		  >1.0  = very loud (use carefully)
 		"""
 		volume = max(0.0, min(float(volume), 1.0))
-		self.fs.setting ("synth.gain", volume)
+		self._send("set_gain", volume)
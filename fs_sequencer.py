@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+from ctypes import c_int, c_short, c_void_p
+
+import fluidsynth
+
+# Not wrapped by pyfluidsynth: bound here with its own helper (None if the library lacks them)
+fluid_event_control_change = fluidsynth.cfunc('fluid_event_control_change', None,
+							('evt', c_void_p, 1),
+							('channel', c_int, 1),
+							('control', c_short, 1),
+							('val', c_int, 1))
+
+fluid_sequencer_remove_events = fluidsynth.cfunc('fluid_sequencer_remove_events', None,
+							('seq', c_void_p, 1),
+							('source', c_short, 1),
+							('dest', c_short, 1),
+							('type', c_int, 1))
+
+
+class SequencerOutput:
+	"""
+	Playback output scheduling events into FluidSynth's own sequencer.
+
+	The sequencer is driven by the synth (use_system_timer=False), so its ticks
+	(milliseconds) follow the audio clock: event timing no longer depends on when
+	the Python thread wakes up, as long as events are handed over before they are
+	due. The player uses now() as its clock and hands events over `lookahead`
+	seconds in advance; cancel() drops everything scheduled but not yet played,
+	so that the window can be rescheduled after a tempo change or a pad switch.
+	"""
+
+	def __init__(self, fs: fluidsynth.Synth, lookahead: float = 0.3):
+		self.fs = fs
+		self.lookahead = lookahead
+		self.seq = fluidsynth.Sequencer(time_scale=1000, use_system_timer=False)
+		self.dest = self.seq.register_fluidsynth(fs)
+		self.can_cancel = fluid_sequencer_remove_events is not None
+
+	def now(self) -> float:
+		"""Sequencer (audio) clock in seconds."""
+		return self.seq.get_tick() * 0.001
+
+	def noteon(self, at: float, channel: int, key: int, velocity: int):
+		self.seq.note_on(int(at * 1000), channel, key, velocity, dest=self.dest)
+
+	def noteoff(self, at: float, channel: int, key: int):
+		self.seq.note_off(int(at * 1000), channel, key, dest=self.dest)
+
+	def cc(self, at: float, channel: int, control: int, value: int):
+		if fluid_event_control_change is None:
+			# no sequencer event for it in this FluidSynth: apply when handed over
+			self.fs.cc(channel, control, value)
+			return
+		evt = fluidsynth.new_fluid_event()
+		fluidsynth.fluid_event_set_source(evt, -1)
+		fluidsynth.fluid_event_set_dest(evt, self.dest)
+		fluid_event_control_change(evt, channel, control, value)
+		fluidsynth.fluid_sequencer_send_at(self.seq.sequencer, evt, int(at * 1000), 1)
+		fluidsynth.delete_fluid_event(evt)
+
+	def cancel(self):
+		if self.can_cancel:
+			fluid_sequencer_remove_events(self.seq.sequencer, -1, self.dest, -1)
+
+	def close(self):
+		self.cancel()
+		self.seq.delete()
@@ -0,0 +1,274 @@
+from __future__ import annotations
+
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy
+import pygame
+
+import fluid_player
+
+
+class LoopCache:
+	"""
+	Rendered PCM loops on disk (one .npy file each), keyed by
+	(MIDI file hash, preset, tempo ratio, gain).
+
+	The directory is kept under max_bytes by deleting the least recently used
+	loops; a cache hit refreshes the file's modification time.
+	"""
+
+	def __init__(self, cache_dir: str | Path = "./.loop_cache", max_bytes: int = 256 * 1024 * 1024):
+		self.cache_dir = Path(cache_dir)
+		self.cache_dir.mkdir(parents=True, exist_ok=True)
+		self.max_bytes = max_bytes
+		self._hashes = {}		# (path, mtime, size) -> content hash, so files are hashed once
+
+	def _file_hash(self, midi_path: str) -> str:
+		st = os.stat(midi_path)
+		stat_key = (midi_path, st.st_mtime_ns, st.st_size)
+		digest = self._hashes.get(stat_key)
+		if digest is None:
+			digest = hashlib.sha1(Path(midi_path).read_bytes()).hexdigest()
+			self._hashes[stat_key] = digest
+		return digest
+
+	def key(self, midi_path: str, preset: int, speed: float, gain: float) -> str:
+		return f"{self._file_hash(midi_path)}_p{preset}_s{speed:.3f}_g{gain:.3f}"
+
+	def load(self, key: str) -> numpy.ndarray | None:
+		path = self.cache_dir / (key + ".npy")
+		try:
+			samples = numpy.load(path)
+		except (OSError, ValueError):
+			return None
+		os.utime(path)		# mark as recently used
+		return samples
+
+	def store(self, key: str, samples: numpy.ndarray):
+		path = self.cache_dir / (key + ".npy")
+		tmp = self.cache_dir / (key + ".tmp.npy")
+		numpy.save(tmp, samples)
+		os.replace(tmp, path)
+		self._evict()
+
+	def _evict(self):
+		files = []
+		for f in self.cache_dir.glob("*.npy"):
+			try:
+				st = f.stat()
+			except OSError:
+				continue
+			files.append((st.st_mtime, st.st_size, f))
+		total = sum(size for _, size, _ in files)
+		for _, size, f in sorted(files, key=lambda item: item[0]):
+			if total <= self.max_bytes:
+				break
+			f.unlink(missing_ok=True)
+			total -= size
+
+
+class PcmLoopEngine:
+	"""
+	Low-CPU playback engine: each pad is rendered offline (at the current sound and
+	tempo) into a PCM buffer holding exactly one loop, and the buffer is looped
+	sample-accurately by the pygame mixer. Steady-state playback costs no synthesis.
+
+	Release tails past the end of the loop are mixed back into its start, so the
+	loop is seamless. The buffers are cached in a LoopCache. Rendering is done by a
+	background thread: a pad hit that is not in the cache keeps the previous loop
+	playing until its own is ready, and a tempo or sound change re-renders the playing
+	pad, the new buffer taking over at the same loop phase once ready. That re-render
+	comes before any preload. Volume is applied by the mixer, so the volume knob never
+	triggers a render.
+
+	Exposes the subset of LiveFsPlayer used by autobass.py.
+	"""
+	RENDER_GAIN = 1.0			# loops are rendered at full synth gain, scaled by the mixer volume
+	TAIL_SECONDS = 2.0
+
+	def __init__(
+		self,
+		sf2_path: str,
+		cache_dir: str | Path = "./.loop_cache",
+		max_bytes: int = 256 * 1024 * 1024,
+		mixer_buffer: int = 512,
+	):
+		self.renderer = fluid_player.LiveFsPlayer(sf2_path, audio_driver=None)
+		self.pad_cache = self.renderer.pad_cache
+		self.cache = LoopCache(cache_dir, max_bytes)
+		self.quantize = fluid_player.QUANTIZE_IMMEDIATE		# switching is always immediate here
+
+		sample_rate = int(self.renderer.fs.get_setting("synth.sample-rate") or 44100)
+		pygame.mixer.quit()		# pygame.init() may have opened it with other settings
+		pygame.mixer.init(frequency=sample_rate, size=-16, channels=2, buffer=mixer_buffer)
+		self.channel = pygame.mixer.Channel(0)
+
+		self.speed = 1.0
+		self.preset = 0
+		self.volume = 0.5
+		self._playing = None		# midi path of the pad playing (or being rendered to play)
+		self._loop = True
+		self._fresh = False			# the pad playing is waiting for its first render
+		self._loop_seconds = 0.0
+		self._started = 0.0			# time.monotonic() of loop phase 0
+		self._lock = threading.Lock()			# guards the playing state
+		self._render_lock = threading.Lock()	# the offline synth renders one pad at a time
+
+		self._swap = None			# (midi path, settings) to render for the pad playing
+		self._preloads = []			# (midi path, settings) to render ahead, after the swap
+		self._closed = False
+		self._wakeup = threading.Condition()
+		self._worker = threading.Thread(target=self._render_worker, daemon=True)
+		self._worker.start()
+
+	def _settings(self):
+		return self.preset, round(self.speed, 3), self.RENDER_GAIN
+
+	def _render_loop(self, midi_path: str, preset: int, speed: float, gain: float) -> numpy.ndarray:
+		key = self.cache.key(midi_path, preset, speed, gain)
+		samples = self.cache.load(key)
+		if samples is not None:
+			return samples
+
+		with self._render_lock:
+			# the synth keeps no state between renders but the program and gain passed here
+			result = self.renderer.render(midi_path, speed=speed, preset=preset, gain=gain, tail=self.TAIL_SECONDS)
+		stream = self.pad_cache.get_or_prepare(midi_path).stream
+		loop_frames = max(1, int(round(stream.length / speed * result.sample_rate)))
+		mixed = numpy.zeros((loop_frames, 2), numpy.int32)
+		body = result.samples[:loop_frames]
+		mixed[:len(body)] += body
+		# fold everything ringing past the loop end back onto its start
+		for start in range(loop_frames, len(result.samples), loop_frames):
+			chunk = result.samples[start:start + loop_frames]
+			mixed[:len(chunk)] += chunk
+		samples = numpy.clip(mixed, -32768, 32767).astype(numpy.int16)
+		self.cache.store(key, samples)
+		return samples
+
+	def _start(self, midi_path: str, samples: numpy.ndarray, phase: float = 0.0, loop: bool = True):
+		"""Loop `samples` from `phase` (0.0-1.0 of the loop)."""
+		frames = len(samples)
+		offset = int(phase * frames) % frames
+		if offset:
+			samples = numpy.roll(samples, -offset, axis=0)
+		sound = pygame.sndarray.make_sound(numpy.ascontiguousarray(samples))
+		self.channel.set_volume(self.volume)
+		self.channel.play(sound, loops=-1 if loop else 0)
+		self._playing = midi_path if loop else None
+		self._loop = loop
+		self._fresh = False
+		self._loop_seconds = frames / pygame.mixer.get_init()[0]
+		self._started = time.monotonic() - phase * self._loop_seconds
+
+	def _phase(self) -> float:
+		if not self._loop_seconds:
+			return 0.0
+		return ((time.monotonic() - self._started) / self._loop_seconds) % 1.0
+
+	def play(self, midi_path: str, loop: bool = True, quantize: str | None = None, program: tuple[int, int] | None = None) -> float:
+		"""
+		Starts looping a pad, returns reference BPM
+		If the pad is not in the loop cache yet, it is rendered in the background and
+		starts once ready; the previous loop plays on meanwhile.
+		program: (bank, preset) to render the pad with (the bank is not used here)
+		"""
+		if program is not None:
+			self.preset = int(program[1])
+		pad = self.pad_cache.get_or_prepare(midi_path)
+		samples = self.cache.load(self.cache.key(midi_path, *self._settings()))
+		with self._lock:
+			if samples is not None:
+				self._start(midi_path, samples, loop=loop)
+			else:
+				self._playing = midi_path
+				self._loop = loop
+				self._fresh = True
+		if samples is None:
+			self._queue_swap(midi_path)
+		return pad.reference_bpm
+
+	def stop(self):
+		with self._lock:
+			self.channel.stop()
+			self._playing = None
+			self._fresh = False
+
+	def preload(self, midi_paths):
+		"""Prepare and pre-render these pads in the background at the current sound and tempo."""
+		midi_paths = list(midi_paths)
+		self.pad_cache.preload(midi_paths)
+		settings = self._settings()
+		with self._wakeup:
+			# replaces pending preloads: only the latest song and settings matter
+			self._preloads = [(path, settings) for path in midi_paths]
+			self._wakeup.notify()
+
+	def set_speed(self, speed: float):
+		speed = max(fluid_player.MIN_SPEED, min(speed, fluid_player.MAX_SPEED))
+		if round(speed, 3) != round(self.speed, 3):
+			self.speed = speed
+			self._rerender_playing()
+
+	def ramp_speed(self, speed: float, beats: float):
+		# a rendered loop has one tempo: the ramp is a plain tempo change
+		self.set_speed(speed)
+
+	def align_beat(self, beat_time: float, speed: float):
+		# a rendered loop cannot be nudged without a glitch: only the tempo follows the taps
+		self.set_speed(speed)
+
+	def set_all_instruments(self, bank: int, preset: int, skip_drums: bool = True):
+		if int(preset) != self.preset:
+			self.preset = int(preset)
+			self._rerender_playing()
+
+	def set_master_volume(self, volume: float):
+		self.volume = max(0.0, min(float(volume), 1.0))
+		self.channel.set_volume(self.volume)
+
+	def close(self):
+		self.stop()
+		with self._wakeup:
+			self._closed = True
+			self._wakeup.notify()
+		self.renderer.close()
+
+	def _rerender_playing(self):
+		if self._playing is not None:
+			self._queue_swap(self._playing)
+
+	def _queue_swap(self, midi_path: str):
+		# replaces a pending swap: only the latest sound/tempo matters during a knob sweep
+		with self._wakeup:
+			self._swap = (midi_path, self._settings())
+			self._wakeup.notify()
+
+	def _render_worker(self):
+		while True:
+			with self._wakeup:
+				while not self._closed and self._swap is None and not self._preloads:
+					self._wakeup.wait()
+				if self._closed:
+					return
+				swap = self._swap is not None
+				if swap:
+					(midi_path, settings), self._swap = self._swap, None
+				else:
+					midi_path, settings = self._preloads.pop(0)
+
+			try:
+				samples = self._render_loop(midi_path, *settings)
+			except Exception as e:
+				print("loop render failed:", midi_path, e)
+				continue
+
+			if swap:
+				with self._lock:
+					# take over only if that pad still plays with those settings
+					if self._playing == midi_path and self._settings() == settings:
+						self._start(midi_path, samples, 0.0 if self._fresh else self._phase(), self._loop)
@@ -0,0 +1,132 @@
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import mido
+
+from event_stream import EventStream, compile_midi
+from tempo_map import TempoMap, build_tempo_map
+
+
+@dataclass(frozen=True)
+class PreparedPad:
+	path: str
+	stream: EventStream
+	tempo_map: TempoMap
+
+	@property
+	def reference_bpm(self) -> float:
+		return self.tempo_map.bpm
+
+	@property
+	def nbytes(self) -> int:
+		s = self.stream
+		t = self.tempo_map
+		arrays = (s.ticks, s.times, s.ops, s.channels, s.data1, s.data2, t.beat_times, t.bar_times)
+		return sum(a.itemsize * len(a) for a in arrays)
+
+
+def prepare_pad(midi_path: str) -> PreparedPad:
+	"""Parse a pad MIDI file (once) into everything playback needs."""
+	mid = mido.MidiFile(midi_path)
+	return PreparedPad(
+		path=midi_path,
+		stream=compile_midi(mid),
+		tempo_map=build_tempo_map(mid),
+	)
+
+
+class PadCache:
+	"""
+	Bounded LRU of PreparedPad, evicting least recently used pads once the
+	cached event data exceeds max_bytes.
+
+	Entries are keyed by (path, mtime, size) so a file replaced on disk (e.g. by
+	a Drive sync) is prepared again. A worker thread prepares pads queued with
+	preload() so that a pad press only has to do a dictionary lookup.
+	"""
+
+	def __init__(self, max_bytes: int = 8 * 1024 * 1024):
+		self.max_bytes = max_bytes
+		self._entries = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+
+		self._pending = []
+		self._wakeup = threading.Condition()
+		self._worker = threading.Thread(target=self._preload_worker, daemon=True)
+		self._worker.start()
+
+	@staticmethod
+	def _key(midi_path: str):
+		st = os.stat(midi_path)
+		return (midi_path, st.st_mtime_ns, st.st_size)
+
+	def get(self, midi_path: str) -> PreparedPad | None:
+		"""Return the cached pad, or None if it is not prepared yet."""
+		try:
+			key = self._key(midi_path)
+		except OSError:
+			return None
+		with self._lock:
+			pad = self._entries.get(key)
+			if pad is not None:
+				self._entries.move_to_end(key)
+			return pad
+
+	def get_or_prepare(self, midi_path: str) -> PreparedPad:
+		"""Return the cached pad, preparing (and caching) it on a miss."""
+		pad = self.get(midi_path)
+		if pad is None:
+			pad = prepare_pad(midi_path)
+			self._put(self._key(midi_path), pad)
+		return pad
+
+	def preload(self, midi_paths):
+		"""
+		Prepare the given files in the background, in order.
+		Replaces whatever was still pending, so a knob sweep does not pile up work.
+		"""
+		with self._wakeup:
+			self._pending = list(midi_paths)
+			self._wakeup.notify()
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._bytes = 0
+
+	def __len__(self):
+		return len(self._entries)
+
+	@property
+	def nbytes(self) -> int:
+		return self._bytes
+
+	def _put(self, key, pad: PreparedPad):
+		with self._lock:
+			old = self._entries.pop(key, None)
+			if old is not None:
+				self._bytes -= old.nbytes
+			self._entries[key] = pad
+			self._bytes += pad.nbytes
+			# evict least recently used, but always keep the pad just added
+			while self._bytes > self.max_bytes and len(self._entries) > 1:
+				_, evicted = self._entries.popitem(last=False)
+				self._bytes -= evicted.nbytes
+
+	def _preload_worker(self):
+		while True:
+			with self._wakeup:
+				while not self._pending:
+					self._wakeup.wait()
+				midi_path = self._pending.pop(0)
+
+			try:
+				self.get_or_prepare(midi_path)
+			except Exception as e:
+				# missing or broken file: reported again if the pad is pressed
+				print("preload failed:", midi_path, e)
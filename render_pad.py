@@ -0,0 +1,37 @@
+# render_pad.py
+# Render a pad offline (no audio device) and report how much faster than realtime it went.
+#
+#   python render_pad.py autobass_playlist/riders/main.mid --preset 6 --speed 1.1 --out main.wav
+import argparse
+
+import fluid_player
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Render a MIDI pad to WAV without an audio device.")
+	parser.add_argument("midi", help="MIDI file to render")
+	parser.add_argument("--sf2", default="autobass.sf2", help="soundfont (default: autobass.sf2)")
+	parser.add_argument("--preset", type=int, default=0, help="bass preset (see soundMapping in autobass.py)")
+	parser.add_argument("--speed", type=float, default=1.0, help="tempo ratio")
+	parser.add_argument("--gain", type=float, default=0.5, help="master volume 0.0-1.0")
+	parser.add_argument("--loops", type=int, default=1, help="number of loop passes")
+	parser.add_argument("--block", type=int, default=64, help="frames per get_samples() call")
+	parser.add_argument("--out", default=None, help="WAV file to write (default: none)")
+	args = parser.parse_args()
+
+	player = fluid_player.LiveFsPlayer(args.sf2, audio_driver=None)
+	try:
+		result = player.render(
+			args.midi, speed=args.speed, preset=args.preset, gain=args.gain,
+			loops=args.loops, block_size=args.block,
+		)
+	finally:
+		player.close()
+
+	if args.out:
+		result.write_wav(args.out)
+	print(f"{result.seconds:.2f} s of audio in {result.elapsed:.3f} s: realtime factor {result.realtime_factor:.1f}x")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,60 @@
+# render_scheduler.py
+# Frame-capped redraws: state changes mark parts of the display dirty, and the display is
+# redrawn at most once per frame interval, only when something is dirty.
+import time
+
+
+class RenderScheduler:
+	"""
+	mark() records what changed ("pads", "volume", "tempo", "sound", "songs", "overlay", ...).
+	The main loop asks due() and calls render(draw_function): draw_function gets the set of
+	dirty parts, the set is cleared, and the drawing time is measured (see stats()).
+	timeout() is how long the main loop may sleep before a pending frame is due.
+	"""
+
+	def __init__(self, fps: float = 30.0, now=time.monotonic):
+		self.interval = 1.0 / fps if fps > 0 else 0.0
+		self.now = now
+		self.dirty = set()
+		self.last_frame = float("-inf")
+		self.frames = 0			# redraws done
+		self.marks = 0			# mark() calls, i.e. redraws requested
+		self.last_time = 0.0	# seconds spent in the last redraw
+		self.total_time = 0.0
+		self.max_time = 0.0
+
+	def mark(self, *parts):
+		self.dirty.update(parts)
+		self.marks += 1
+
+	def due(self) -> bool:
+		return bool(self.dirty) and self.now() >= self.last_frame + self.interval
+
+	def timeout(self) -> float | None:
+		"""Seconds until the next frame may be drawn, None when nothing is dirty."""
+		if not self.dirty:
+			return None
+		return max(0.0, self.last_frame + self.interval - self.now())
+
+	def render(self, draw_function):
+		dirty, self.dirty = self.dirty, set()
+		start = self.now()
+		self.last_frame = start
+		draw_function(dirty)
+		self.last_time = self.now() - start
+		self.total_time += self.last_time
+		self.max_time = max(self.max_time, self.last_time)
+		self.frames += 1
+
+	def stats(self) -> dict:
+		return {
+			"frames": self.frames,
+			"marks": self.marks,
+			"last_ms": self.last_time * 1000.0,
+			"mean_ms": self.total_time / self.frames * 1000.0 if self.frames else 0.0,
+			"max_ms": self.max_time * 1000.0,
+		}
+
+	def summary_line(self) -> str:
+		s = self.stats()
+		return f"draw {s['last_ms']:.1f}/{s['max_ms']:.1f} ms, {s['frames']} frames"
@@ -0,0 +1,163 @@
+# replay.py
+# Headless load test of the application loop: replays a controller session into AutoBass
+# with a fake synth and the SDL dummy video driver (no LPD8, screen or sound card needed).
+#
+#   python replay.py                                  # synthetic session, 30 s at 1x
+#   python replay.py --seconds 120 --speed 10         # accelerated
+#   python replay.py --session show.jsonl --playlist ./autobass_playlist
+#
+# A session is recorded by autobass.py when sessionRecordPath is set (one JSON line per
+# MIDI message: {"t": seconds, "msg": mido message dict}). Without --session, a synthetic
+# one is generated: song changes, pad hits, volume/tempo/sound knob sweeps, taps and stops.
+# Reported: handling latency per event type (from the MIDI message to the end of its
+# handling), redraws against redraw requests, drawing time, CPU use.
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+
+import mido
+import pygame
+
+import autobass
+import bench_playback
+import fake_synth
+import fluid_player
+import song
+
+PAD_COLORS = ["0xE04040", "0x40A040", "0x4060E0", "0xE0C040", "0xA040C0", "0x40C0C0"]
+
+
+def _cc(control, value):
+	return mido.Message("control_change", control=control, value=value)
+
+
+def _note(note):
+	return mido.Message("note_on", note=note, velocity=100)
+
+
+def synthetic_session(seconds: float, songs: int):
+	"""List of (time, mido message) playing with every control of the LPD8 mapping."""
+	notes = {v[0] if len(v) == 1 else f"pad {v[1]}": k for k, v in autobass.noteOnMapping.items()}
+	ccs = {v[0]: k for k, v in autobass.ccMapping.items()}
+	session = []
+	t, n = 0.0, 0
+	while t < seconds:
+		# change song (knob step), hit a pad
+		session.append((t, _cc(ccs["playlist"], min(127, int((n % songs + 0.5) * 127 / songs)))))
+		session.append((t + 0.2, _note(notes[f"pad {n % 6}"])))
+		# volume sweep down and up: one CC every 5 ms
+		for k in range(128):
+			session.append((t + 0.5 + k * 0.005, _cc(ccs["volume"], abs(127 - 2 * k) % 128)))
+		# tempo knob sweep
+		for k in range(64):
+			session.append((t + 1.5 + k * 0.008, _cc(ccs["tempo"], 32 + k)))
+		# another pad, then four taps at 100 BPM
+		session.append((t + 2.2, _note(notes[f"pad {(n + 3) % 6}"])))
+		for k in range(4):
+			session.append((t + 2.6 + k * 0.6, _note(notes["tap tempo"])))
+		# sound knob sweep
+		for k in range(0, 128, 4):
+			session.append((t + 5.0 + k * 0.004, _cc(ccs["sound"], k)))
+		if n % 3 == 2:
+			session.append((t + 5.8, _note(notes["stop"])))
+		t += 6.0
+		n += 1
+	return [(at, message) for at, message in sorted(session, key=lambda e: e[0]) if at < seconds]
+
+
+def load_session(file_path: str):
+	session = []
+	with open(file_path, encoding="utf-8") as f:
+		for line in f:
+			if line.strip():
+				entry = json.loads(line)
+				session.append((float(entry["t"]), mido.Message.from_dict(entry["msg"])))
+	return session
+
+
+def synthetic_play_list(asset_path: str, songs: int):
+	play_list = []
+	for n in range(songs):
+		folder = f"song{n}/"
+		os.makedirs(os.path.join(asset_path, folder), exist_ok=True)
+		pads = []
+		for p in range(6):
+			file_name = f"pad{p}.mid"
+			bench_playback.make_midi(os.path.join(asset_path, folder, file_name), notes_per_beat=(1, 2, 4)[p % 3], beats=8, bpm=90 + 10 * n, chord=1 + p % 2)
+			pads.append(song.Pad(name=f"Song {n + 1} part {p + 1}", color=PAD_COLORS[p], file=file_name))
+		play_list.append(song.SongConfig(song=f"Song {n + 1}", tempo=90 + 10 * n, sound="Fingered 1", path=folder, pads=pads))
+	return play_list
+
+
+def feed(app, session, speed: float):
+	"""Give the messages to the app at their time (divided by speed), like the MIDI input thread."""
+	start = time.monotonic()
+	for at, message in session:
+		wait = start + at / speed - time.monotonic()
+		if wait > 0:
+			time.sleep(wait)
+		app.on_midi_message(message)
+	time.sleep(0.2)
+	app.stop()
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Replay a controller session into the app loop, headless.")
+	parser.add_argument("--session", help="recorded session (.jsonl); default: synthetic session")
+	parser.add_argument("--playlist", help="asset folder holding playlist.json (default: synthetic songs)")
+	parser.add_argument("--seconds", type=float, default=30.0, help="length of the synthetic session")
+	parser.add_argument("--songs", type=int, default=4, help="songs of the synthetic playlist")
+	parser.add_argument("--speed", type=float, default=1.0, help="replay speed (10: ten times faster)")
+	args = parser.parse_args()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		if args.playlist:
+			asset_path = args.playlist.rstrip("/")
+			play_list = song.load_song_configs_from_file(asset_path + "/playlist.json")
+		else:
+			asset_path = tmp
+			play_list = synthetic_play_list(asset_path, args.songs)
+		session = load_session(args.session) if args.session else synthetic_session(args.seconds, len(play_list))
+
+		pygame.init()
+		screen = pygame.display.set_mode((480, 320))
+		synth = fake_synth.RecordingSynth()
+		player = fluid_player.LiveFsPlayer("autobass.sf2", audio_driver=None, synth=synth)
+		player.quantize = autobass.launchQuantize
+		app = autobass.AutoBass(play_list, player, screen, asset_path=asset_path)
+
+		latencies = {}
+		def on_handled(event, latency):
+			latencies.setdefault(f"{event.label} {event.values[0]}", []).append(latency)
+		app.on_handled = on_handled
+
+		feeder = threading.Thread(target=feed, args=(app, session, args.speed), daemon=True)
+		wall0, cpu0 = time.monotonic(), time.process_time()
+		feeder.start()
+		try:
+			app.run()
+		finally:
+			wall, cpu = time.monotonic() - wall0, time.process_time() - cpu0
+			player.close()
+			pygame.quit()
+
+	print(f"{len(session)} MIDI messages replayed in {wall:.2f} s (speed {args.speed:g}x), {len(synth.events)} synth events")
+	print(f"{'event':<18}{'handled':>8} | {'latency ms p50/p99/max':>24}")
+	for name, values in sorted(latencies.items()):
+		p50, p99, vmax = (v * 1000 for v in bench_playback.summary(values))
+		print(f"{name:<18}{len(values):>8} | {p50:7.3f} {p99:7.3f} {vmax:8.3f}")
+	stats = app.renderer.stats()
+	print(f"redraws {stats['frames']} for {stats['marks']} requests, draw mean {stats['mean_ms']:.2f} ms max {stats['max_ms']:.2f} ms")
+	print(f"pad grids: {app.dashboard.grids.hits} cached, {app.dashboard.grids.misses} drawn on demand")
+	print(f"cpu {cpu / wall:.1%} of one core ({cpu:.2f} s)")
+	print("playback:", player.timing.summary_line())
+
+
+if __name__ == "__main__":
+	main()
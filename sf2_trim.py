@@ -0,0 +1,211 @@
+# sf2_trim.py
+# Write a copy of a SoundFont 2 file holding only some presets (with their instruments and samples).
+#
+#   python sf2_trim.py autobass.sf2 autobass.min.sf2 --presets 0-11
+#   python sf2_trim.py big.sf2 small.sf2 --presets 32,33,34 --bank 0
+#
+# With only the bass presets left, fluidsynth loads a fraction of the samples at startup.
+# See also LiveFsPlayer(lazy_samples=True), which loads the samples of a preset only when
+# the preset is selected.
+from __future__ import annotations
+
+import argparse
+import struct
+
+# record layouts of the pdta sub-chunks (SoundFont 2.04, section 7)
+PHDR = struct.Struct("<20sHHHIII")		# name, preset, bank, bag index, library, genre, morphology
+BAG = struct.Struct("<HH")				# generator index, modulator index
+MOD = struct.Struct("<HHhHH")			# src, dest, amount, amount src, transform
+GEN = struct.Struct("<HH")				# operator, amount
+INST = struct.Struct("<20sH")			# name, bag index
+SHDR = struct.Struct("<20sIIIIIBbHH")	# name, start, end, loop start, loop end, rate, pitch, correction, link, type
+
+GEN_INSTRUMENT = 41
+GEN_SAMPLE_ID = 53
+SAMPLE_PADDING = 46		# zero sample points required after each sample
+SAMPLE_LINKED = 0x000E	# sfSampleType: right, left or linked sample (the link is a sample index)
+SAMPLE_ROM = 0x8000
+
+PDTA_CHUNKS = (("phdr", PHDR), ("pbag", BAG), ("pmod", MOD), ("pgen", GEN),
+				("inst", INST), ("ibag", BAG), ("imod", MOD), ("igen", GEN), ("shdr", SHDR))
+
+
+def _chunks(data: bytes, start: int, end: int):
+	"""Yield (id, body start, body end) of the RIFF chunks in data[start:end]."""
+	pos = start
+	while pos + 8 <= end:
+		cid = data[pos:pos + 4].decode("latin-1")
+		size = struct.unpack_from("<I", data, pos + 4)[0]
+		yield cid, pos + 8, pos + 8 + size
+		pos += 8 + size + (size & 1)
+
+
+def read_sf2(sf2_path: str) -> dict:
+	"""Parse a SoundFont into {"info": bytes, "smpl": bytes, "sm24": bytes | None, <pdta name>: [tuple, ...]}."""
+	with open(sf2_path, "rb") as f:
+		data = f.read()
+	if data[:4] != b"RIFF" or data[8:12] != b"sfbk":
+		raise ValueError(f"{sf2_path} is not a SoundFont 2 file")
+
+	sf = {"info": b"", "smpl": b"", "sm24": None}
+	for cid, body, end in _chunks(data, 12, len(data)):
+		if cid != "LIST":
+			continue
+		kind = data[body:body + 4]
+		if kind == b"INFO":
+			sf["info"] = data[body + 4:end]
+		elif kind == b"sdta":
+			for sub, sbody, send in _chunks(data, body + 4, end):
+				if sub in ("smpl", "sm24"):
+					sf[sub] = data[sbody:send]
+		elif kind == b"pdta":
+			records = dict(PDTA_CHUNKS)
+			for sub, sbody, send in _chunks(data, body + 4, end):
+				if sub in records:
+					sf[sub] = list(records[sub].iter_unpack(data[sbody:send]))
+
+	for name, _ in PDTA_CHUNKS:
+		if name not in sf:
+			raise ValueError(f"{sf2_path}: missing {name} chunk")
+	return sf
+
+
+def trim_sf2(sf: dict, keep) -> dict:
+	"""
+	Return a new parsed SoundFont with only the presets whose (bank, preset) is in keep,
+	the instruments they use and the samples those use (plus linked stereo samples).
+	"""
+	keep = set(keep)
+	phdr, pbag, pmod, pgen = sf["phdr"], sf["pbag"], sf["pmod"], sf["pgen"]
+	inst, ibag, imod, igen = sf["inst"], sf["ibag"], sf["imod"], sf["igen"]
+	shdr = sf["shdr"]
+
+	out = {"info": sf["info"], "phdr": [], "pbag": [], "pmod": [], "pgen": [],
+			"inst": [], "ibag": [], "imod": [], "igen": [], "shdr": []}
+
+	# 1) presets (the last phdr record is the EOP terminal)
+	presets = [i for i in range(len(phdr) - 1) if (phdr[i][2], phdr[i][1]) in keep]
+	used_inst = []
+	for p in presets:
+		for b in range(phdr[p][3], phdr[p + 1][3]):
+			for g in range(pbag[b][0], pbag[b + 1][0]):
+				if pgen[g][0] == GEN_INSTRUMENT and pgen[g][1] not in used_inst:
+					used_inst.append(pgen[g][1])
+	inst_map = {old: new for new, old in enumerate(used_inst)}
+
+	# 2) samples used by those instruments, with their stereo links
+	used_smpl = []
+	for i in used_inst:
+		for b in range(inst[i][1], inst[i + 1][1]):
+			for g in range(ibag[b][0], ibag[b + 1][0]):
+				if igen[g][0] == GEN_SAMPLE_ID and igen[g][1] not in used_smpl:
+					used_smpl.append(igen[g][1])
+	for s in used_smpl:		# also visits the links appended, for chains of linked samples
+		link, stype = shdr[s][8], shdr[s][9]
+		if stype & SAMPLE_LINKED and not stype & SAMPLE_ROM and link < len(shdr) - 1 and link not in used_smpl:
+			used_smpl.append(link)		# mono samples have no link (usually 0, not sample 0)
+	smpl_map = {old: new for new, old in enumerate(used_smpl)}
+
+	# 3) preset zones
+	for p in presets:
+		rec = phdr[p]
+		out["phdr"].append(rec[:3] + (len(out["pbag"]),) + rec[4:])
+		for b in range(rec[3], phdr[p + 1][3]):
+			out["pbag"].append((len(out["pgen"]), len(out["pmod"])))
+			out["pmod"].extend(pmod[pbag[b][1]:pbag[b + 1][1]])
+			for g in range(pbag[b][0], pbag[b + 1][0]):
+				op, amount = pgen[g]
+				out["pgen"].append((op, inst_map[amount] if op == GEN_INSTRUMENT else amount))
+	out["phdr"].append((b"EOP".ljust(20, b"\0"), 0, 0, len(out["pbag"]), 0, 0, 0))
+	out["pbag"].append((len(out["pgen"]), len(out["pmod"])))
+	out["pmod"].append((0, 0, 0, 0, 0))
+	out["pgen"].append((0, 0))
+
+	# 4) instrument zones
+	for i in used_inst:
+		out["inst"].append((inst[i][0], len(out["ibag"])))
+		for b in range(inst[i][1], inst[i + 1][1]):
+			out["ibag"].append((len(out["igen"]), len(out["imod"])))
+			out["imod"].extend(imod[ibag[b][1]:ibag[b + 1][1]])
+			for g in range(ibag[b][0], ibag[b + 1][0]):
+				op, amount = igen[g]
+				out["igen"].append((op, smpl_map[amount] if op == GEN_SAMPLE_ID else amount))
+	out["inst"].append((b"EOI".ljust(20, b"\0"), len(out["ibag"])))
+	out["ibag"].append((len(out["igen"]), len(out["imod"])))
+	out["imod"].append((0, 0, 0, 0, 0))
+	out["igen"].append((0, 0))
+
+	# 5) sample data: each kept sample followed by the mandatory zero padding
+	smpl, sm24 = bytearray(), bytearray() if sf["sm24"] is not None else None
+	for s in used_smpl:
+		name, start, end, loop_start, loop_end, rate, pitch, corr, link, stype = shdr[s]
+		new_start = len(smpl) // 2
+		smpl += sf["smpl"][start * 2:end * 2] + bytes(2 * SAMPLE_PADDING)
+		if sm24 is not None:
+			sm24 += sf["sm24"][start:end] + bytes(SAMPLE_PADDING)
+		shift = new_start - start
+		if stype & SAMPLE_ROM:
+			new_link = link
+		else:
+			new_link = smpl_map.get(link, 0) if stype & SAMPLE_LINKED else 0
+		out["shdr"].append((name, start + shift, end + shift, loop_start + shift, loop_end + shift,
+							rate, pitch, corr, new_link, stype))
+	out["shdr"].append((b"EOS".ljust(20, b"\0"), 0, 0, 0, 0, 0, 0, 0, 0, 0))
+	out["smpl"] = bytes(smpl)
+	out["sm24"] = bytes(sm24) if sm24 is not None else None
+	return out
+
+
+def _chunk(cid: bytes, body: bytes) -> bytes:
+	return cid + struct.pack("<I", len(body)) + body + (b"\0" if len(body) & 1 else b"")
+
+
+def write_sf2(sf: dict, sf2_path: str):
+	sdta = _chunk(b"smpl", sf["smpl"])
+	if sf.get("sm24") is not None:
+		sdta += _chunk(b"sm24", sf["sm24"])
+	pdta = b"".join(
+		_chunk(name.encode(), b"".join(layout.pack(*rec) for rec in sf[name]))
+		for name, layout in PDTA_CHUNKS
+	)
+	body = (b"sfbk"
+			+ _chunk(b"LIST", b"INFO" + sf["info"])
+			+ _chunk(b"LIST", b"sdta" + sdta)
+			+ _chunk(b"LIST", b"pdta" + pdta))
+	with open(sf2_path, "wb") as f:
+		f.write(_chunk(b"RIFF", body))
+
+
+def _parse_presets(text: str):
+	"""'0-11' or '0,1,5' or '0-3,8' -> [0, 1, ...]"""
+	presets = []
+	for part in text.split(","):
+		if "-" in part:
+			lo, hi = part.split("-")
+			presets.extend(range(int(lo), int(hi) + 1))
+		elif part.strip():
+			presets.append(int(part))
+	return presets
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Keep only some presets of a SoundFont 2 file.")
+	parser.add_argument("input", help="source .sf2")
+	parser.add_argument("output", help="trimmed .sf2 to write")
+	parser.add_argument("--presets", required=True, help="preset numbers to keep, e.g. 0-11 or 0,2,5")
+	parser.add_argument("--bank", type=int, default=0, help="bank of those presets (default 0)")
+	args = parser.parse_args()
+
+	sf = read_sf2(args.input)
+	trimmed = trim_sf2(sf, [(args.bank, p) for p in _parse_presets(args.presets)])
+	write_sf2(trimmed, args.output)
+	print(
+		f"kept {len(trimmed['phdr']) - 1}/{len(sf['phdr']) - 1} presets, "
+		f"{len(trimmed['inst']) - 1}/{len(sf['inst']) - 1} instruments, "
+		f"{len(trimmed['shdr']) - 1}/{len(sf['shdr']) - 1} samples, "
+		f"{len(trimmed['smpl']) // 1024} KiB of {len(sf['smpl']) // 1024} KiB sample data"
+	)
+
+
+if __name__ == "__main__":
+	main()
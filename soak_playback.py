@@ -0,0 +1,245 @@
+# soak_playback.py
+# Soak test of the playback path: hours of looping pads, tempo, sound and song changes,
+# checking that memory, threads and timing do not drift. Uses a fake synth by default.
+#
+#   python soak_playback.py --hours 0.25                 # accelerated (pads played 3-4x faster)
+#   python soak_playback.py --hours 3 --realtime         # show tempo (0.8-1.2x)
+#   python soak_playback.py --hours 3 --realtime --driver alsa --sf2 autobass.sf2   # real synth
+#   python soak_playback.py --hours 3 --realtime --single     # one pad looping for 3 hours
+#
+# Every --segment seconds the next pad (of a rotating set of files and densities) is played
+# at a new tempo and sound. Every --sample seconds the process RSS, live Python objects,
+# thread count and the position error are printed. The position error is how far the notes
+# actually sent to the synth are from where the loop should be, measured from the first
+# note of the segment, so it grows if the loop drifts within a segment. With --single, one
+# pad is started once and loops for the whole run, and every segment only changes its tempo
+# and sound: the position error is then measured from the first note of the run, across
+# all the tempo changes, so drift accumulated over hours shows (as the error of the
+# earliest note of each segment, which leaves out the player's lateness). With a real synth
+# (--driver), the notes sent cannot be seen and the player's own lateness is used instead.
+# Exit status 1 when a threshold is passed (growth is measured from the end of the first
+# cycle over all the pads, once caches are warm).
+import argparse
+import gc
+import os
+import random
+import resource
+import tempfile
+import threading
+import time
+
+import bench_playback
+import fake_synth
+import fluid_player
+from event_stream import OP_NOTE_ON
+
+DENSITIES = [(1, 1), (2, 1), (4, 2), (8, 1), (4, 3), (16, 2)]		# (notes per beat, voices)
+
+
+def rss_bytes() -> int:
+	"""Resident set size of this process (peak size where /proc is not available)."""
+	try:
+		with open("/proc/self/statm") as f:
+			return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+	except (OSError, ValueError):
+		return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class NoteLog:
+	"""note-on times seen by the fake synth during the current segment."""
+
+	def __init__(self):
+		self.times = []
+
+	def __call__(self, event):
+		if event[1] == "note_on":
+			self.times.append(event[0])
+
+	def reset(self):
+		self.times = []
+
+
+def segment_error(times, stream, speed) -> float:
+	"""Largest distance (seconds) of the note-ons of one segment from the loop grid of its first note."""
+	offsets = [stream.times[i] for i in range(len(stream)) if stream.ops[i] == OP_NOTE_ON]
+	if not times or not offsets:
+		return 0.0
+	worst = 0.0
+	for k, actual in enumerate(times):
+		n, i = divmod(k, len(offsets))
+		expected = times[0] + (n * stream.length + offsets[i] - offsets[0]) / speed
+		worst = max(worst, abs(actual - expected))
+	return worst
+
+
+class PositionCheck:
+	"""
+	Position error of the note-ons of one pad looping for the whole run (--single), against
+	a song-position model kept by the test: from the first note on, the position advances at
+	the tempo ratio the test sets, re-anchored at each tempo change. Each note is checked as
+	it is sent to the synth, so nothing piles up over hours. The time the player takes to
+	apply a tempo change (well under a millisecond) shifts the model by that time times
+	the change of ratio.
+	Lateness of the player only delays notes, so the earliest note of a segment is on time
+	unless the loop drifted: drift() is the error of that note.
+	"""
+
+	def __init__(self, stream, speed):
+		self.offsets = [stream.times[i] for i in range(len(stream)) if stream.ops[i] == OP_NOTE_ON]
+		self.length = stream.length
+		self.speed = speed
+		self.anchors = []		# (time, song position, speed) of the last two tempo changes
+		self.count = 0
+		self.earliest = None	# lowest error (seconds, signed) since the last drift()
+
+	def set_speed(self, speed, now):
+		"""Called when the player's tempo ratio is changed."""
+		anchors = self.anchors
+		if anchors:
+			t, p, s = anchors[-1]
+			self.anchors = [anchors[-1], (now, p + (now - t) * s, speed)]
+		self.speed = speed
+
+	def __call__(self, event):
+		if event[1] != "note_on" or not self.offsets:
+			return
+		n, i = divmod(self.count, len(self.offsets))
+		position = n * self.length + self.offsets[i]
+		self.count += 1
+		anchors = self.anchors
+		if not anchors:
+			self.anchors = [(event[0], position, self.speed)]
+			return
+		t, p, s = anchors[0]
+		for t, p, s in reversed(anchors):
+			if p <= position:
+				break
+		error = event[0] - (t + (position - p) / s)
+		if self.earliest is None or error < self.earliest:
+			self.earliest = error
+
+	def drift(self) -> float:
+		"""Position error of the earliest note since the last call (seconds)."""
+		earliest, self.earliest = self.earliest, None
+		return abs(earliest or 0.0)
+
+
+def main():
+	parser = argparse.ArgumentParser(description="Soak test of LiveFsPlayer: memory, threads and loop drift over hours.")
+	parser.add_argument("--hours", type=float, default=1.0)
+	parser.add_argument("--realtime", action="store_true", help="show tempos (0.8-1.2x) instead of 3-4x")
+	parser.add_argument("--driver", help="audio driver of a real synth (default: fake synth)")
+	parser.add_argument("--sf2", default="autobass.sf2")
+	parser.add_argument("--segment", type=float, default=20.0, help="seconds between pad/tempo/sound changes")
+	parser.add_argument("--sample", type=float, default=60.0, help="seconds between measurements")
+	parser.add_argument("--seed", type=int, default=1)
+	parser.add_argument("--single", action="store_true", help="loop one pad for the whole run, changing only tempo and sound")
+	parser.add_argument("--max-rss-growth", type=float, default=16.0, help="MiB")
+	parser.add_argument("--max-object-growth", type=float, default=0.10, help="fraction of live objects")
+	parser.add_argument("--max-thread-growth", type=int, default=0)
+	parser.add_argument("--max-error", type=float, default=20.0, help="position error, ms")
+	args = parser.parse_args()
+
+	random.seed(args.seed)
+	speeds = (0.8, 1.2) if args.realtime else (3.0, 4.0)
+
+	with tempfile.TemporaryDirectory() as tmp:
+		paths = []
+		for n, (notes_per_beat, chord) in enumerate(DENSITIES):
+			path = os.path.join(tmp, f"soak{n}.mid")
+			bench_playback.make_midi(path, notes_per_beat, beats=4 * (1 + n % 3), bpm=80 + 15 * n, chord=chord)
+			paths.append(path)
+
+		notes = NoteLog()
+		if args.driver:
+			player = fluid_player.LiveFsPlayer(args.sf2, args.driver, "default")
+		else:
+			synth = fake_synth.RecordingSynth(keep_events=False)
+			synth.on_event = notes
+			player = fluid_player.LiveFsPlayer(args.sf2, audio_driver=None, synth=synth)
+
+		check = None
+		if args.single:
+			# the densest pad, started once
+			path = paths[-1]
+			speed = random.uniform(*speeds)
+			check = PositionCheck(player.pad_cache.get_or_prepare(path).stream, speed)
+			if not args.driver:
+				synth.on_event = check
+			player.set_speed(speed)
+			player.play(path, loop=True, quantize=fluid_player.QUANTIZE_IMMEDIATE)
+
+		start = time.monotonic()
+		end = start + args.hours * 3600.0
+		next_sample = start
+		segment = 0
+		baseline = None
+		worst_error = 0.0
+		failures = []
+		print(f"{'minutes':>8} {'segments':>9} {'rss MiB':>8} {'objects':>9} {'threads':>8} {'error ms':>9} {'late':>6}")
+		try:
+			while time.monotonic() < end:
+				if args.single:
+					# same pad playing on: new tempo and sound only
+					speed = random.uniform(*speeds)
+					player.set_speed(speed)
+					check.set_speed(speed, time.monotonic())
+					player.set_all_instruments(bank=0, preset=segment % 12, skip_drums=True)
+				else:
+					path = paths[segment % len(paths)]
+					speed = random.uniform(*speeds)
+					player.stop()
+					time.sleep(0.05)
+					notes.reset()
+					player.set_speed(speed)
+					player.set_all_instruments(bank=0, preset=segment % 12, skip_drums=True)
+					player.play(path, loop=True, quantize=fluid_player.QUANTIZE_IMMEDIATE)
+				time.sleep(min(args.segment, max(0.0, end - time.monotonic())))
+
+				if args.driver:
+					error = player.timing.snapshot()["max"]
+				elif args.single:
+					error = check.drift()
+				else:
+					error = segment_error(list(notes.times), player.pad_cache.get(path).stream, speed)
+				worst_error = max(worst_error, error)
+				segment += 1
+
+				now = time.monotonic()
+				if now >= next_sample or now >= end:
+					next_sample = now + args.sample
+					gc.collect()
+					sample = (rss_bytes(), len(gc.get_objects()), threading.active_count())
+					if baseline is None and segment >= len(paths):
+						baseline = sample
+					print(
+						f"{(now - start) / 60.0:8.1f} {segment:9d} {sample[0] / 2**20:8.1f} {sample[1]:9d} "
+						f"{sample[2]:8d} {worst_error * 1000:9.3f} {player.timing.late_total:6d}"
+					)
+		finally:
+			player.close()
+
+	if baseline is None:
+		print("run too short to cycle through all the pads: no growth check")
+	else:
+		rss_growth = (sample[0] - baseline[0]) / 2**20
+		object_growth = (sample[1] - baseline[1]) / baseline[1]
+		thread_growth = sample[2] - baseline[2]
+		if rss_growth > args.max_rss_growth:
+			failures.append(f"RSS grew by {rss_growth:.1f} MiB (max {args.max_rss_growth})")
+		if object_growth > args.max_object_growth:
+			failures.append(f"live objects grew by {object_growth:.1%} (max {args.max_object_growth:.0%})")
+		if thread_growth > args.max_thread_growth:
+			failures.append(f"threads grew by {thread_growth} (max {args.max_thread_growth})")
+	if worst_error * 1000 > args.max_error:
+		failures.append(f"position error reached {worst_error * 1000:.1f} ms (max {args.max_error})")
+
+	for failure in failures:
+		print("FAIL:", failure)
+	if failures:
+		raise SystemExit(1)
+	print("OK")
+
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+
+import mido
+
+DEFAULT_TEMPO = 500000		# MIDI default: 120 BPM (microseconds per quarter note)
+
+
+class TempoMap:
+	"""
+	Tempo changes, time signatures and the resulting beat/bar grid of a MIDI file.
+
+	  bpm         reference tempo in quarter notes per minute (the tempo lasting
+	              the most beats), exact when the file has set_tempo meta events
+	  beat_times  absolute beat positions in seconds at speed 1.0
+	  bar_times   absolute bar (downbeat) positions in seconds at speed 1.0
+	  length      file length in seconds at speed 1.0
+	"""
+
+	def __init__(self, ticks_per_beat: int):
+		self.ticks_per_beat = ticks_per_beat
+		self.tempos = []				# [(tick, seconds, microseconds per quarter), ...]
+		self.time_signatures = []		# [(tick, numerator, denominator), ...]
+		self.beat_times = array("d")
+		self.bar_times = array("d")
+		self.length = 0.0
+		self.bpm = 120.0
+		self.has_tempo_meta = False
+
+	def next_boundary(self, position: float, bar: bool = False) -> float:
+		"""
+		First beat (or bar) position >= position, in seconds at speed 1.0.
+		Positions past the end of the file wrap around, as the file is looped.
+		"""
+		grid = self.bar_times if bar else self.beat_times
+		if not grid or self.length <= 0.0:
+			return position
+		loops, offset = divmod(position, self.length)
+		i = bisect_left(grid, offset)
+		if i < len(grid):
+			return loops * self.length + grid[i]
+		return (loops + 1) * self.length + grid[0]
+
+	def beat_length(self, position: float = 0.0) -> float:
+		"""Length of the beat around position, in seconds at speed 1.0."""
+		grid = self.beat_times
+		if len(grid) < 2 or self.length <= 0.0:
+			return 60.0 / self.bpm
+		i = bisect_left(grid, position % self.length)
+		i = min(max(i, 1), len(grid) - 1)
+		return grid[i] - grid[i - 1]
+
+	def beat_phase(self, position: float) -> float:
+		"""
+		Signed distance from the nearest beat to position (position - beat), in seconds
+		at speed 1.0: positive when position is just after a beat.
+		"""
+		grid = self.beat_times
+		if not grid or self.length <= 0.0:
+			return 0.0
+		offset = position % self.length
+		i = bisect_left(grid, offset)
+		before = grid[i - 1] if i > 0 else grid[-1] - self.length
+		after = grid[i] if i < len(grid) else grid[0] + self.length
+		return offset - before if offset - before <= after - offset else offset - after
+
+
+def build_tempo_map(source: str | Path | mido.MidiFile) -> TempoMap:
+	"""
+	Read set_tempo / time_signature meta events and build the beat/bar grid in
+	one linear pass. Falls back to pretty_midi's estimate when the file has no
+	tempo meta event.
+	"""
+	mid = source if isinstance(source, mido.MidiFile) else mido.MidiFile(source)
+	tpb = mid.ticks_per_beat
+	tmap = TempoMap(tpb)
+
+	tempo = DEFAULT_TEMPO
+	numerator, denominator = 4, 4
+	tmap.tempos.append((0, 0.0, tempo))
+	tmap.time_signatures.append((0, numerator, denominator))
+	beats_per_tempo = {}
+
+	tick = 0
+	now = 0.0
+	next_beat = 0			# tick of the next grid beat
+	beat_in_bar = 0
+
+	def advance_grid(until_tick):
+		# emit every grid beat in [next_beat, until_tick); tempo is constant in between
+		nonlocal next_beat, beat_in_bar
+		beat_ticks = tpb * 4 // denominator
+		while next_beat < until_tick:
+			at = now + mido.tick2second(next_beat - tick, tpb, tempo)
+			tmap.beat_times.append(at)
+			if beat_in_bar == 0:
+				tmap.bar_times.append(at)
+			beat_in_bar = (beat_in_bar + 1) % numerator
+			next_beat += beat_ticks
+			beats_per_tempo[tempo] = beats_per_tempo.get(tempo, 0.0) + beat_ticks / tpb
+
+	for msg in mido.merge_tracks(mid.tracks):
+		if msg.time:
+			advance_grid(tick + msg.time)
+			now += mido.tick2second(msg.time, tpb, tempo)
+			tick += msg.time
+
+		if msg.type == "set_tempo":
+			tempo = msg.tempo
+			tmap.has_tempo_meta = True
+			if tmap.tempos[-1][0] == tick:
+				tmap.tempos[-1] = (tick, now, tempo)
+			else:
+				tmap.tempos.append((tick, now, tempo))
+
+		elif msg.type == "time_signature":
+			numerator, denominator = msg.numerator, msg.denominator
+			# a new time signature starts a new bar (grid beats before this tick are already emitted)
+			next_beat = tick
+			beat_in_bar = 0
+			if tmap.time_signatures[-1][0] == tick:
+				tmap.time_signatures[-1] = (tick, numerator, denominator)
+			else:
+				tmap.time_signatures.append((tick, numerator, denominator))
+
+	tmap.length = now
+
+	if tmap.has_tempo_meta:
+		dominant = max(beats_per_tempo, key=beats_per_tempo.get) if beats_per_tempo else tempo
+		tmap.bpm = mido.tempo2bpm(dominant)
+	else:
+		tmap.bpm = _estimate_bpm(mid)
+
+	return tmap
+
+
+def _estimate_bpm(mid: mido.MidiFile) -> float:
+	# slow statistical estimate, only for files without any tempo meta event
+	import pretty_midi
+	try:
+		pm = pretty_midi.PrettyMIDI(mid.filename) if mid.filename else None
+		return float(pm.estimate_tempo()) if pm else mido.tempo2bpm(DEFAULT_TEMPO)
+	except ValueError:
+		# fewer than two notes: MIDI default tempo
+		return mido.tempo2bpm(DEFAULT_TEMPO)
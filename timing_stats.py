@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import json
+import time
+from array import array
+
+
+def _percentile(sorted_values, p):
+	if not sorted_values:
+		return 0.0
+	return sorted_values[min(len(sorted_values) - 1, int(round(p / 100.0 * (len(sorted_values) - 1))))]
+
+
+class TimingRecorder:
+	"""
+	Per-event timing of the playback thread, kept in preallocated ring buffers.
+
+	record() only writes three floats into arrays allocated up front, so it can be
+	called for every dispatched event. Statistics (lateness percentiles, late-event
+	count, dispatch time, loop-boundary gap) are computed on demand over the last
+	`capacity` events by snapshot(), which is meant to be called from the main loop.
+	Times are in seconds on the player's clock.
+	"""
+	HISTOGRAM_EDGES_MS = (0.5, 1, 2, 5, 10, 20, 50)
+	VALUE_NAME = "lateness_ms"
+
+	def __init__(self, capacity: int = 4096, late_threshold: float = 0.005, gap_capacity: int = 256):
+		self.capacity = capacity
+		self.late_threshold = late_threshold
+		self.scheduled = array("d", bytes(8 * capacity))
+		self.actual = array("d", bytes(8 * capacity))
+		self.dispatch = array("d", bytes(8 * capacity))
+		self.gaps = array("d", bytes(8 * gap_capacity))
+		self._next = 0
+		self._next_gap = 0
+		self.total = 0				# events recorded since start
+		self.late_total = 0			# of which later than late_threshold
+		self.gap_total = 0
+		self.max_lateness = 0.0		# since start
+
+	def record(self, scheduled: float, actual: float, dispatch: float):
+		i = self._next
+		self.scheduled[i] = scheduled
+		self.actual[i] = actual
+		self.dispatch[i] = dispatch
+		self._next = i + 1 if i + 1 < self.capacity else 0
+		self.total += 1
+		lateness = actual - scheduled
+		if lateness > self.late_threshold:
+			self.late_total += 1
+		if lateness > self.max_lateness:
+			self.max_lateness = lateness
+
+	def record_loop_gap(self, gap_error: float):
+		"""Error of the interval between the last event of a loop pass and the first of the next."""
+		i = self._next_gap
+		self.gaps[i] = gap_error
+		self._next_gap = (i + 1) % len(self.gaps)
+		self.gap_total += 1
+
+	def reset(self):
+		self._next = self._next_gap = 0
+		self.total = self.late_total = self.gap_total = 0
+		self.max_lateness = 0.0
+
+	def _value(self, i) -> float:
+		"""Value of event i in the histogram and the dump (lateness)."""
+		return self.actual[i] - self.scheduled[i]
+
+	def _ordered(self):
+		"""Indices of the recorded events, oldest first."""
+		n = min(self.total, self.capacity)
+		start = (self._next - n) % self.capacity
+		return [(start + k) % self.capacity for k in range(n)]
+
+	def snapshot(self) -> dict:
+		idx = self._ordered()
+		lateness = sorted(max(0.0, self.actual[i] - self.scheduled[i]) for i in idx)
+		dispatch = sorted(self.dispatch[i] for i in idx)
+		gaps = [abs(self.gaps[i]) for i in range(min(self.gap_total, len(self.gaps)))]
+		return {
+			"events": self.total,
+			"window": len(idx),
+			"last": max(0.0, self.actual[idx[-1]] - self.scheduled[idx[-1]]) if idx else 0.0,
+			"mean": sum(lateness) / len(lateness) if lateness else 0.0,
+			"p50": _percentile(lateness, 50),
+			"p95": _percentile(lateness, 95),
+			"p99": _percentile(lateness, 99),
+			"max": self.max_lateness,
+			"late": sum(1 for v in lateness if v > self.late_threshold),
+			"late_total": self.late_total,
+			"dispatch_p99": _percentile(dispatch, 99),
+			"loop_gap_max": max(gaps) if gaps else 0.0,
+		}
+
+	def histogram(self, edges_ms=None) -> list:
+		"""Counts of lateness over the window: [< edges[0], < edges[1], ..., >= edges[-1]]."""
+		edges_ms = edges_ms or self.HISTOGRAM_EDGES_MS
+		counts = [0] * (len(edges_ms) + 1)
+		for i in self._ordered():
+			ms = self._value(i) * 1000.0
+			k = 0
+			while k < len(edges_ms) and ms >= edges_ms[k]:
+				k += 1
+			counts[k] += 1
+		return counts
+
+	def summary_line(self) -> str:
+		"""Short text for the dashboard overlay (milliseconds)."""
+		s = self.snapshot()
+		return (
+			f"late p50 {s['p50'] * 1000:.1f} p99 {s['p99'] * 1000:.1f} "
+			f"max {s['max'] * 1000:.1f} ms, {s['late_total']} late, gap {s['loop_gap_max'] * 1000:.1f}"
+		)
+
+	def dump(self, file_path: str):
+		"""Write the summary (first line, JSON) and the window of events (CSV) to a file."""
+		with open(file_path, "w", encoding="utf-8") as f:
+			summary = self.snapshot()
+			summary["histogram_edges_ms"] = list(self.HISTOGRAM_EDGES_MS)
+			summary["histogram"] = self.histogram()
+			summary["dumped_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+			f.write("# " + json.dumps(summary) + "\n")
+			f.write(f"scheduled,actual,{self.VALUE_NAME},dispatch_ms\n")
+			for i in self._ordered():
+				f.write(
+					f"{self.scheduled[i]:.6f},{self.actual[i]:.6f},"
+					f"{self._value(i) * 1000:.3f},{self.dispatch[i] * 1000:.3f}\n"
+				)
+
+
+class HandoverRecorder(TimingRecorder):
+	"""
+	Timing of a player that hands its events over to a scheduler ahead of time (the
+	"sequencer" backend, see fs_sequencer.py). `actual` is then the hand-over time, not
+	when the event is heard, so lateness and loop-boundary gaps are not measured: the
+	lead (how long before its deadline each event was handed over) is reported instead.
+	An event handed over after its deadline plays late; those are counted as missed.
+	"""
+	HISTOGRAM_EDGES_MS = (0, 50, 100, 150, 200, 250, 300)
+	VALUE_NAME = "lead_ms"
+
+	def record_loop_gap(self, gap_error: float):
+		pass
+
+	def _value(self, i) -> float:
+		return self.scheduled[i] - self.actual[i]
+
+	def snapshot(self) -> dict:
+		idx = self._ordered()
+		lead = sorted(self._value(i) for i in idx)
+		dispatch = sorted(self.dispatch[i] for i in idx)
+		return {
+			"events": self.total,
+			"window": len(idx),
+			"handover": True,
+			"lead_min": lead[0] if lead else 0.0,
+			"lead_p50": _percentile(lead, 50),
+			"missed": sum(1 for v in lead if v < -self.late_threshold),
+			"missed_total": self.late_total,
+			"dispatch_p99": _percentile(dispatch, 99),
+		}
+
+	def summary_line(self) -> str:
+		s = self.snapshot()
+		return (
+			f"hand-over lead p50 {s['lead_p50'] * 1000:.1f} min {s['lead_min'] * 1000:.1f} ms, "
+			f"{s['missed_total']} missed"
+		)
@@ -1,17 +1,18 @@
 import os
 import re
 import io
+import json
 import uuid
 import shutil
-import socket
+from dataclasses import dataclass
 from pathlib import Path
 
-import httplib2
-from googleapiclient.discovery import build
-from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaIoBaseDownload  # chunked downloads [5](https://googleapis.github.io/google-api-python-client/docs/epy/googleapiclient.http.MediaIoBaseDownload-class.html)
+# httplib2 and googleapiclient are imported when a download starts: importing them takes
+# seconds on a Pi, and autobass runs the sync in the background after startup
 
 FOLDER_MIME = "application/vnd.google-apps.folder"
+MANIFEST_NAME = ".drive_manifest.json"		# in the synced folder: Drive metadata of each local file
+FILE_FIELDS = "id,name,mimeType,md5Checksum,modifiedTime,size"
 
 
 def _extract_drive_id(url_or_id: str) -> str | None:
@@ -29,41 +30,102 @@ def _extract_drive_id(url_or_id: str) -> str | None:
 	return m.group(1) if m else None
 
 
-def download_public_drive_folder(
+@dataclass
+class SyncResult:
+	path: str				# local folder
+	downloaded: int = 0		# new or changed files
+	deleted: int = 0		# files removed from Drive, removed locally
+	unchanged: int = 0
+	bytes: int = 0			# bytes downloaded
+	list_calls: int = 0		# files.get / files.list requests
+
+	@property
+	def changed(self) -> bool:
+		return bool(self.downloaded or self.deleted)
+
+
+def _build_service(api_key: str, timeout_sec: float):
+	import httplib2
+	from googleapiclient.discovery import build
+
+	# Per-request timeout is set when constructing httplib2.Http [6](http://httplib2.readthedocs.io/en/latest/libhttplib2.html)[7](https://googleapis.dev/python/google-auth-httplib2/latest/google_auth_httplib2.html)
+	http = httplib2.Http(timeout=timeout_sec)
+	return build("drive", "v3", developerKey=api_key, http=http, cache_discovery=False)
+
+
+def _same_file(local: dict | None, remote: dict) -> bool:
+	"""Is the file described by the local manifest entry the one on Drive?"""
+	if not local:
+		return False
+	if remote.get("md5Checksum"):
+		return local.get("md5Checksum") == remote["md5Checksum"] and local.get("size") == remote.get("size")
+	return local.get("modifiedTime") == remote.get("modifiedTime") and local.get("size") == remote.get("size")
+
+
+def _download_file(service, file_id: str, out_path: Path) -> int:
+	out_path.parent.mkdir(parents=True, exist_ok=True)
+	request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
+	from googleapiclient.http import MediaIoBaseDownload  # chunked downloads [5](https://googleapis.github.io/google-api-python-client/docs/epy/googleapiclient.http.MediaIoBaseDownload-class.html)
+	with io.FileIO(out_path, "wb") as fh:
+		downloader = MediaIoBaseDownload(fh, request, chunksize=1024 * 1024)
+		done = False
+		while not done:
+			_, done = downloader.next_chunk(num_retries=0)
+	return out_path.stat().st_size
+
+
+def _copy_unchanged(src: Path, dst: Path):
+	# hard link: no data copied, and the old tree can still be removed afterwards
+	dst.parent.mkdir(parents=True, exist_ok=True)
+	try:
+		os.link(src, dst)
+	except OSError:
+		shutil.copy2(src, dst)
+
+
+def sync_public_drive_folder(
 	folder_url_or_id: str,
-	api_key: str,
+	api_key: str | None = None,
 	dest_root: str | os.PathLike = ".",
 	*,
 	timeout_sec: float = 5.0,
 	erase_existing: bool = True,
-) -> str | None:
+	service=None,
+) -> SyncResult | None:
 	"""
-	Download a *publicly accessible* Google Drive folder recursively using an API key.
+	Bring a local copy of a *publicly accessible* Google Drive folder up to date.
 
-	Returns:
-	  - local folder path (str) on success
-	  - None on failure (no network, timeout, not a folder, no permission, etc.)
+	The Drive tree is listed with md5Checksum/modifiedTime/size, and compared with the
+	manifest saved in the local folder by the previous sync: only new or changed files
+	are downloaded, files removed from Drive are removed locally. If nothing changed,
+	nothing is written (the cost is the listing requests). Otherwise the new tree is built
+	in a staging folder (unchanged files hard-linked from the current one) and swapped
+	with the current folder only once complete.
+
+	service: object with the googleapiclient Drive v3 interface (default: built with
+	api_key), e.g. fake_drive.FakeDriveService for tests.
+
+	Returns None on failure (no network, timeout, not a folder, no permission, etc.)
 
 	Notes:
 	  - API key access cannot read private folders/files. [1](https://googleapis.github.io/google-api-python-client/docs/start.html)
 	  - Recursion uses files.list with q="'<id>' in parents". [2](https://developers.google.com/workspace/drive/api/reference/rest/v3/files/list)[3](https://stackoverflow.com/questions/60177954/google-drive-api-v3-is-there-anyway-to-list-of-files-and-folders-from-a-root-fo)[4](https://developers.google.com/workspace/drive/api/guides/search-files)
 	"""
 	folder_id = _extract_drive_id(folder_url_or_id)
-	if not folder_id or not api_key:
+	if not folder_id or (service is None and not api_key):
 		return None
 
-	# Per-request timeout is set when constructing httplib2.Http [6](http://httplib2.readthedocs.io/en/latest/libhttplib2.html)[7](https://googleapis.dev/python/google-auth-httplib2/latest/google_auth_httplib2.html)
-	http = httplib2.Http(timeout=timeout_sec)
-	service = build("drive", "v3", developerKey=api_key, http=http, cache_discovery=False)
-
-	# 1) Validate folder + get name
 	try:
+		if service is None:
+			service = _build_service(api_key, timeout_sec)
+
+		# 1) Validate folder + get name
 		meta = service.files().get(
 			fileId=folder_id,
 			fields="id,name,mimeType",
 			supportsAllDrives=True,
 		).execute()
-	except (HttpError, socket.timeout, socket.gaierror, OSError):
+	except Exception:		# HttpError, socket.timeout, socket.gaierror, OSError, or no client library
 		return None
 
 	if meta.get("mimeType") != FOLDER_MIME:
@@ -72,12 +134,14 @@ def download_public_drive_folder(
 	folder_name = meta.get("name") or f"drive_folder_{folder_id}"
 	dest_root = Path(dest_root)
 	final_path = dest_root / folder_name
+	result = SyncResult(path=str(final_path), list_calls=1)
 
-	# 2) Stage download first (do not touch existing until success)
-	staging_parent = dest_root / f".gdrive_staging_{folder_name}_{uuid.uuid4().hex}"
-	staging_parent.mkdir(parents=True, exist_ok=False)
-	staging_folder = staging_parent / folder_name
-	staging_folder.mkdir(parents=True, exist_ok=False)
+	if final_path.exists() and not erase_existing:
+		return result
+
+	# leftovers of an interrupted sync
+	for old in dest_root.glob(f".gdrive_staging_{folder_name}_*"):
+		shutil.rmtree(old, ignore_errors=True)
 
 	def list_children(parent_id: str):
 		# files.list supports q filtering; we use "'<id>' in parents and trashed=false" [2](https://developers.google.com/workspace/drive/api/reference/rest/v3/files/list)[4](https://developers.google.com/workspace/drive/api/guides/search-files)
@@ -85,68 +149,99 @@ def download_public_drive_folder(
 		while True:
 			resp = service.files().list(
 				q=f"'{parent_id}' in parents and trashed=false",
-				fields="nextPageToken,files(id,name,mimeType)",
+				fields=f"nextPageToken,files({FILE_FIELDS})",
 				pageSize=1000,
 				pageToken=page_token,
 				includeItemsFromAllDrives=True,
 				supportsAllDrives=True,
 			).execute()
+			result.list_calls += 1
 			for f in resp.get("files", []):
 				yield f
 			page_token = resp.get("nextPageToken")
 			if not page_token:
 				break
 
-	def download_file(file_id: str, out_path: Path):
-		out_path.parent.mkdir(parents=True, exist_ok=True)
-		request = service.files().get_media(fileId=file_id, supportsAllDrives=True)
-		with io.FileIO(out_path, "wb") as fh:
-			downloader = MediaIoBaseDownload(fh, request, chunksize=1024 * 1024)  # [5](https://googleapis.github.io/google-api-python-client/docs/epy/googleapiclient.http.MediaIoBaseDownload-class.html)
-			done = False
-			while not done:
-				_, done = downloader.next_chunk(num_retries=0)
-
-	# 3) Traverse + download
+	# 2) List the Drive tree: {relative path: metadata}
+	remote, folders = {}, []
 	try:
-		stack = [(folder_id, staging_folder)]
+		stack = [(folder_id, "")]
 		while stack:
-			current_id, current_local = stack.pop()
+			current_id, current_rel = stack.pop()
 			for item in list_children(current_id):
 				name = item.get("name") or item["id"]
-				mime = item.get("mimeType")
-				item_id = item["id"]
-				local_path = current_local / name
-
-				if mime == FOLDER_MIME:
-					local_path.mkdir(parents=True, exist_ok=True)
-					stack.append((item_id, local_path))
+				rel = f"{current_rel}{name}"
+				if item.get("mimeType") == FOLDER_MIME:
+					folders.append(rel)
+					stack.append((item["id"], rel + "/"))
 				else:
-					download_file(item_id, local_path)
-
-	except (HttpError, socket.timeout, socket.gaierror, OSError):
-		shutil.rmtree(staging_parent, ignore_errors=True)
+					remote[rel] = {k: item.get(k) for k in ("id", "md5Checksum", "modifiedTime", "size")}
+	except Exception:
 		return None
+
+	# 3) Compare with the local manifest
+	try:
+		manifest = json.loads((final_path / MANIFEST_NAME).read_text(encoding="utf-8"))
+	except (OSError, ValueError):
+		manifest = {}
+	unchanged = {
+		rel for rel, info in remote.items()
+		if _same_file(manifest.get(rel), info) and (final_path / rel).is_file()
+	}
+	result.unchanged = len(unchanged)
+	result.deleted = len([rel for rel in manifest if rel not in remote and (final_path / rel).exists()])
+	if len(unchanged) == len(remote) and not result.deleted and all((final_path / rel).is_dir() for rel in folders):
+		return result		# up to date: nothing downloaded, nothing written
+
+	# 4) Stage the new tree (do not touch the current one until it is complete)
+	staging_parent = dest_root / f".gdrive_staging_{folder_name}_{uuid.uuid4().hex}"
+	staging_folder = staging_parent / folder_name
+	try:
+		staging_folder.mkdir(parents=True, exist_ok=False)
+		for rel in folders:
+			(staging_folder / rel).mkdir(parents=True, exist_ok=True)
+		for rel, info in remote.items():
+			if rel in unchanged:
+				_copy_unchanged(final_path / rel, staging_folder / rel)
+			else:
+				result.bytes += _download_file(service, info["id"], staging_folder / rel)
+				result.downloaded += 1
+		(staging_folder / MANIFEST_NAME).write_text(json.dumps(remote, indent=1), encoding="utf-8")
 	except Exception:
 		shutil.rmtree(staging_parent, ignore_errors=True)
 		return None
 
-	# 4) Commit (replace existing only after successful staging)
+	# 5) Commit: swap the folders with two renames, then drop the old tree
+	old_path = staging_parent / (folder_name + ".old")
 	try:
 		if final_path.exists():
-			if not erase_existing:
-				shutil.rmtree(staging_parent, ignore_errors=True)
-				return str(final_path)
+			final_path.rename(old_path)
+		staging_folder.rename(final_path)
+	except OSError:
+		if old_path.exists() and not final_path.exists():
+			old_path.rename(final_path)		# put the previous tree back
+		shutil.rmtree(staging_parent, ignore_errors=True)
+		return None
+	shutil.rmtree(staging_parent, ignore_errors=True)
+	return result
 
-			# remove only now
-			if final_path.is_dir():
-				shutil.rmtree(final_path)
-			else:
-				final_path.unlink()
 
-		shutil.move(str(staging_folder), str(final_path))
-		shutil.rmtree(staging_parent, ignore_errors=True)
-		return str(final_path)
+def download_public_drive_folder(
+	folder_url_or_id: str,
+	api_key: str,
+	dest_root: str | os.PathLike = ".",
+	*,
+	timeout_sec: float = 5.0,
+	erase_existing: bool = True,
+) -> str | None:
+	"""
+	Sync a *publicly accessible* Google Drive folder with an API key (see sync_public_drive_folder).
 
-	except Exception:
-		shutil.rmtree(staging_parent, ignore_errors=True)
-		return None
+	Returns:
+	  - local folder path (str) on success
+	  - None on failure (no network, timeout, not a folder, no permission, etc.)
+	"""
+	result = sync_public_drive_folder(
+		folder_url_or_id, api_key, dest_root, timeout_sec=timeout_sec, erase_existing=erase_existing
+	)
+	return result.path if result is not None else None